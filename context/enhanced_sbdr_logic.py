@@ -7,11 +7,25 @@ configuration and responses from a JSON knowledge base file.
 import json
 import re
 import random
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, asdict
+import functools
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Any, Tuple
+from dataclasses import dataclass, field
 from enum import Enum
 from pathlib import Path
 
+try:
+    import ahocorasick
+except ImportError:  # optional accelerator; falls back to substring checks
+    ahocorasick = None
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # optional accelerator; stdlib json accepts bytes as well
+    _json_loads = json.loads
+
 class Intent(Enum):
     GREETING = "greeting"
     PRODUCT_INQUIRY = "product_inquiry"
@@ -30,7 +44,95 @@ class QualificationStatus(Enum):
     QUALIFIED = "qualified"
     UNQUALIFIED = "unqualified"
 
-@dataclass
+# Only the most recent messages are kept per profile
+_HISTORY_MAXLEN = 100
+_now = time.time_ns
+
+# Intents and statuses that call for qualification questions
+_QUALIFY_INTENTS = frozenset({Intent.PRODUCT_INQUIRY, Intent.PRICING, Intent.GENERAL, Intent.GREETING})
+_PENDING_STATUSES = frozenset({QualificationStatus.NOT_STARTED, QualificationStatus.IN_PROGRESS})
+
+# Intent patterns in priority order; "product_inquiry" is filled in from the
+# knowledge base categories when the intent regex is built
+_INTENT_PATTERNS = (
+    (Intent.GREETING, r'\b(?:hello|hi|hey|good\s+(?:morning|afternoon|evening)|greetings)\b'
+                      r'|\b(?:howdy|what\'s\s+up|sup)\b'),
+    (Intent.PRODUCT_INQUIRY, None),
+    (Intent.PRICING, r'\b(?:price|cost|budget|how\s+much|expensive|cheap|affordable)\b'
+                     r'|\$\d+|\d+\s*dollars?'),
+    (Intent.ORDER_STATUS, r'\b(?:order|tracking|delivery|shipped|status|where\s+is\s+my)\b'),
+    (Intent.SHIPPING, r'\b(?:shipping|delivery|when\s+will|how\s+long|arrive|fast)\b'),
+    (Intent.SUPPORT, r'\b(?:help|support|problem|issue|broken|not\s+working|trouble)\b'),
+    (Intent.HANDOFF_REQUEST, r'\b(?:human|agent|representative|person|speak\s+to\s+someone|manager)\b'),
+)
+_INTENT_RANK = {intent.value: rank for rank, (intent, _) in enumerate(_INTENT_PATTERNS)}
+_DEFAULT_PRODUCT_KEYWORDS = (
+    "laptop", "computer", "phone", "smartphone", "tablet", "headphones",
+    "earbuds", "smartwatch", "watch", "monitor", "keyboard", "mouse"
+)
+
+# Policy name -> keywords that point at it, in lookup priority order
+_POLICY_KEYWORDS = (
+    ("shipping_policy", ("ship", "delivery", "arrive", "fast")),
+    ("return_policy", ("return", "refund", "exchange")),
+    ("warranty_policy", ("warranty", "guarantee", "protection")),
+    ("payment_policy", ("payment", "pay", "credit", "paypal")),
+    ("price_matching", ("price match", "match price", "competitor"))
+)
+
+def _build_automaton(keywords: Dict[str, Any]) -> Any:
+    """Build an Aho-Corasick automaton over keywords, or None without pyahocorasick."""
+    if ahocorasick is None or not keywords:
+        return None
+    automaton = ahocorasick.Automaton()
+    for keyword, value in keywords.items():
+        automaton.add_word(keyword, value)
+    automaton.make_automaton()
+    return automaton
+
+def _iter_keyword_hits(automaton: Any, keywords: Dict[str, Any], text: str):
+    """Yield the values of all keywords found in text."""
+    if automaton is not None:
+        return (value for _, value in automaton.iter(text))
+    return (value for keyword, value in keywords.items() if keyword in text)
+
+def _build_intent_re(product_keywords: List[str]) -> re.Pattern:
+    """Fuse all intent patterns into one alternation with a named group per intent."""
+    alternatives = []
+    for intent, pattern in _INTENT_PATTERNS:
+        if pattern is None:
+            pattern = "|".join(re.escape(keyword) for keyword in product_keywords if keyword)
+        alternatives.append(f"(?P<{intent.value}>{pattern})")
+    return re.compile("|".join(alternatives), re.IGNORECASE)
+
+# Qualification patterns
+_DIGIT_RE = re.compile(r'\d')
+_BUDGET_RES = tuple(re.compile(p, re.IGNORECASE) for p in (
+    r'\$(\d+(?:,\d{3})*(?:\.\d{2})?)',
+    r'(\d+(?:,\d{3})*)\s*dollars?',
+    r'under\s*\$?(\d+(?:,\d{3})*)',
+    r'around\s*\$?(\d+(?:,\d{3})*)',
+    r'about\s*\$?(\d+(?:,\d{3})*)',
+    r'budget.*?\$?(\d+(?:,\d{3})*)',
+    r'(\d+(?:,\d{3})*)\s*buck',
+    r'up\s+to\s*\$?(\d+(?:,\d{3})*)'
+))
+_USE_CASE_RES: Dict[str, Tuple[re.Pattern, ...]] = {
+    "business": (re.compile(r'\b(business|work|office|professional|corporate)\b', re.IGNORECASE),),
+    "gaming": (re.compile(r'\b(gaming|game|gamer|esports|streaming)\b', re.IGNORECASE),),
+    "education": (re.compile(r'\b(school|student|education|study|learning|college)\b', re.IGNORECASE),),
+    "creative": (re.compile(r'\b(design|photo|video|creative|art|editing)\b', re.IGNORECASE),),
+    "personal": (re.compile(r'\b(personal|home|family|casual|everyday)\b', re.IGNORECASE),),
+    "fitness": (re.compile(r'\b(fitness|workout|exercise|health|running)\b', re.IGNORECASE),)
+}
+_TIMELINE_RES: Dict[str, Tuple[re.Pattern, ...]] = {
+    "immediate": (re.compile(r'\b(now|today|asap|immediately|urgent)\b', re.IGNORECASE),),
+    "this_week": (re.compile(r'\b(this\s+week|within\s+a\s+week|soon)\b', re.IGNORECASE),),
+    "this_month": (re.compile(r'\b(this\s+month|within\s+a\s+month)\b', re.IGNORECASE),),
+    "researching": (re.compile(r'\b(research|looking|browsing|comparing|just\s+checking)\b', re.IGNORECASE),)
+}
+
+@dataclass(slots=True)
 class UserProfile:
     session_id: str
     name: str = "Guest"
@@ -40,26 +142,145 @@ class UserProfile:
     use_case: Optional[str] = None
     timeline: Optional[str] = None
     qualification_status: QualificationStatus = QualificationStatus.NOT_STARTED
-    conversation_history: List[Dict] = None
+    conversation_history: Deque[Dict] = None
+    message_count: int = 0
     engagement_score: int = 0
+    question_cursor: int = 0
+    intent_set: set = field(default_factory=set)
+    # int(budget) memoized against the budget string it was parsed from
+    _budget_src: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    _budget_int: Optional[int] = field(default=None, init=False, repr=False, compare=False)
     
     def __post_init__(self):
         if self.conversation_history is None:
-            self.conversation_history = []
+            self.conversation_history = deque(maxlen=_HISTORY_MAXLEN)
+    
+    def budget_value(self) -> int:
+        """Return the budget as an int (0 when unset); raises ValueError if unparseable."""
+        if not self.budget:
+            return 0
+        if self.budget is not self._budget_src:
+            self._budget_src = self.budget
+            try:
+                self._budget_int = int(self.budget)
+            except (ValueError, TypeError):
+                self._budget_int = None
+        if self._budget_int is None:
+            raise ValueError(f"invalid budget: {self.budget!r}")
+        return self._budget_int
+
+@dataclass
+class _KBIndex:
+    """Lookup structures derived from a knowledge base, built once per KB."""
+    intent_re: re.Pattern
+    product_category_names: List[str]
+    product_keywords: Dict[str, Tuple[Tuple[int, ...], Tuple[int, ...]]]
+    policy_names: List[str]
+    policy_keywords: Dict[str, int]
+    product_ac: Any = None
+    policy_ac: Any = None
+    
+    @classmethod
+    def build(cls, knowledge_base: Dict[str, Any]) -> "_KBIndex":
+        product_categories = knowledge_base.get("product_categories", {})
+        category_names = list(product_categories.keys())
+        
+        # Index category names and brand aliases for single-pass product matching
+        keywords: Dict[str, Tuple[List[int], List[int]]] = {}
+        for index, category in enumerate(category_names):
+            keywords.setdefault(category, ([], []))[0].append(index)
+            for brand in product_categories[category].get("popular_brands", []):
+                keywords.setdefault(brand.lower(), ([], []))[1].append(index)
+        product_keywords = {
+            keyword: (tuple(categories), tuple(brands))
+            for keyword, (categories, brands) in keywords.items() if keyword
+        }
+        
+        # Invert policy keywords, keeping only policies this knowledge base defines
+        policies = knowledge_base.get("policies", {})
+        policy_names: List[str] = []
+        policy_keywords: Dict[str, int] = {}
+        for name, policy_keyword_list in _POLICY_KEYWORDS:
+            if name in policies:
+                for keyword in policy_keyword_list:
+                    policy_keywords.setdefault(keyword, len(policy_names))
+                policy_names.append(name)
+        
+        return cls(
+            intent_re=_build_intent_re(category_names + list(_DEFAULT_PRODUCT_KEYWORDS)),
+            product_category_names=category_names,
+            product_keywords=product_keywords,
+            policy_names=policy_names,
+            policy_keywords=policy_keywords,
+            product_ac=_build_automaton(product_keywords),
+            policy_ac=_build_automaton(policy_keywords)
+        )
+
+@functools.lru_cache(maxsize=8)
+def _load_kb_cached(path: str, mtime_ns: int) -> Tuple[Dict[str, Any], _KBIndex]:
+    """Parse a knowledge base file and build its index; cached per file version."""
+    knowledge_base = _json_loads(Path(path).read_bytes())
+    return knowledge_base, _KBIndex.build(knowledge_base)
 
 class EnhancedSBDRAgent:
-    def __init__(self, knowledge_base_path: str = "knowledge_base.json"):
-        self.knowledge_base = self._load_knowledge_base(knowledge_base_path)
-        self.user_profiles: Dict[str, UserProfile] = {}
+    def __init__(self, knowledge_base_path: str = "knowledge_base.json",
+                 randomize_questions: bool = False,
+                 max_sessions: int = 10_000,
+                 session_ttl: Optional[float] = 3600):
+        self.knowledge_base, self._kb_index = self._load_knowledge_base(knowledge_base_path)
+        self.randomize_questions = randomize_questions
+        
+        # Profiles are kept in least-recently-used order and bounded in number
+        # and idle time (seconds; None disables expiry)
+        self.user_profiles: "OrderedDict[str, UserProfile]" = OrderedDict()
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self._last_seen: Dict[str, float] = {}
         
-    def _load_knowledge_base(self, path: str) -> Dict[str, Any]:
-        """Load knowledge base from JSON file."""
+        # Sub-sections read on every message
+        self._policies = self.knowledge_base.get("policies", {})
+        self._product_categories = self.knowledge_base.get("product_categories", {})
+        self._question_bank = self.knowledge_base.get("qualification_questions", {})
+        self._handoff_messages = tuple(self.knowledge_base.get("common_responses", {}).get("handoff_triggers", (
+            "Let me connect you with one of our specialists who can provide more detailed assistance.",
+        )))
+        self._handoff_cursor = 0
+        self._escalation = self.knowledge_base.get("escalation_criteria", {})
+        qualified_criteria = self._escalation.get("qualified_lead", {})
+        self._qualified_min_budget = qualified_criteria.get("budget_minimum", 100)
+        
+    def _load_knowledge_base(self, path: str) -> Tuple[Dict[str, Any], _KBIndex]:
+        """Load knowledge base from JSON file along with its derived index.
+        
+        Parsed files are memoized on (path, mtime) so agents sharing a knowledge
+        base reuse the same data and compiled matchers.
+        """
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return _load_kb_cached(str(Path(path).resolve()), Path(path).stat().st_mtime_ns)
         except FileNotFoundError:
             print(f"Warning: Knowledge base file {path} not found. Using minimal fallback.")
-            return self._get_fallback_knowledge_base()
+            knowledge_base = self._get_fallback_knowledge_base()
+            return knowledge_base, _KBIndex.build(knowledge_base)
+    
+    def _match_product_category(self, message_lower: str) -> Optional[str]:
+        """Return the product category mentioned in the message, if any.
+        
+        A category name wins over a brand mention (first category in knowledge
+        base order); otherwise the last category listing a mentioned brand is used.
+        """
+        kb_index = self._kb_index
+        hits = _iter_keyword_hits(kb_index.product_ac, kb_index.product_keywords, message_lower)
+        
+        first_category = None
+        last_brand = None
+        for categories, brands in hits:
+            if categories and (first_category is None or categories[0] < first_category):
+                first_category = categories[0]
+            if brands and (last_brand is None or brands[-1] > last_brand):
+                last_brand = brands[-1]
+        
+        index = first_category if first_category is not None else last_brand
+        return kb_index.product_category_names[index] if index is not None else None
     
     def _get_fallback_knowledge_base(self) -> Dict[str, Any]:
         """Provide a minimal fallback knowledge base."""
@@ -81,124 +302,69 @@ class EnhancedSBDRAgent:
     
     def detect_intent(self, message: str) -> Intent:
         """Enhanced intent detection with better pattern matching."""
-        message_lower = message.lower()
-        
-        # Greeting patterns
-        greeting_patterns = [
-            r'\b(hello|hi|hey|good\s+(morning|afternoon|evening)|greetings)\b',
-            r'\b(howdy|what\'s\s+up|sup)\b'
-        ]
-        if any(re.search(pattern, message_lower) for pattern in greeting_patterns):
-            return Intent.GREETING
-            
-        # Product inquiry patterns
-        product_categories = list(self.knowledge_base.get("product_categories", {}).keys())
-        product_patterns = product_categories + [
-            "laptop", "computer", "phone", "smartphone", "tablet", "headphones", 
-            "earbuds", "smartwatch", "watch", "monitor", "keyboard", "mouse"
-        ]
-        if any(pattern in message_lower for pattern in product_patterns):
-            return Intent.PRODUCT_INQUIRY
-            
-        # Pricing patterns
-        pricing_patterns = [
-            r'\b(price|cost|budget|how\s+much|expensive|cheap|affordable)\b',
-            r'\$\d+', r'\d+\s*dollars?'
-        ]
-        if any(re.search(pattern, message_lower) for pattern in pricing_patterns):
-            return Intent.PRICING
-            
-        # Order status patterns
-        order_patterns = [
-            r'\b(order|tracking|delivery|shipped|status|where\s+is\s+my)\b'
-        ]
-        if any(re.search(pattern, message_lower) for pattern in order_patterns):
-            return Intent.ORDER_STATUS
-            
-        # Shipping patterns
-        shipping_patterns = [
-            r'\b(shipping|delivery|when\s+will|how\s+long|arrive|fast)\b'
-        ]
-        if any(re.search(pattern, message_lower) for pattern in shipping_patterns):
-            return Intent.SHIPPING
-            
-        # Support patterns
-        support_patterns = [
-            r'\b(help|support|problem|issue|broken|not\s+working|trouble)\b'
-        ]
-        if any(re.search(pattern, message_lower) for pattern in support_patterns):
-            return Intent.SUPPORT
-            
-        # Handoff request patterns
-        handoff_patterns = [
-            r'\b(human|agent|representative|person|speak\s+to\s+someone|manager)\b'
-        ]
-        if any(re.search(pattern, message_lower) for pattern in handoff_patterns):
-            return Intent.HANDOFF_REQUEST
+        # One pass over the message; keep the highest-priority intent seen
+        best_rank = len(_INTENT_PATTERNS)
+        for match in self._kb_index.intent_re.finditer(message):
+            rank = _INTENT_RANK[match.lastgroup]
+            if rank < best_rank:
+                best_rank = rank
+                if rank == 0:
+                    break
+        if best_rank < len(_INTENT_PATTERNS):
+            return _INTENT_PATTERNS[best_rank][0]
             
         return Intent.GENERAL
     
-    def extract_qualification_data(self, message: str) -> Dict[str, Optional[str]]:
-        """Enhanced qualification data extraction."""
-        message_lower = message.lower()
+    def classify_batch(self, messages: List[str]) -> List[Intent]:
+        """Detect intents for many messages at once, e.g. when replaying logs.
+        
+        Conversation logs repeat the same short messages heavily, so each
+        distinct message is classified only once.
+        """
+        detect_intent = self.detect_intent
+        seen: Dict[str, Intent] = {}
+        intents = []
+        for message in messages:
+            intent = seen.get(message)
+            if intent is None:
+                intent = seen[message] = detect_intent(message)
+            intents.append(intent)
+        return intents
+    
+    def extract_qualification_data(self, message: str,
+                                   message_lower: Optional[str] = None) -> Dict[str, Optional[str]]:
+        """Enhanced qualification data extraction.
+        
+        Callers that already hold a lowercased copy of the message can pass it
+        as ``message_lower`` to avoid lowering it again.
+        """
         extracted_data = {}
         
         # Extract budget information with more patterns
-        budget_patterns = [
-            r'\$(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            r'(\d+(?:,\d{3})*)\s*dollars?',
-            r'under\s*\$?(\d+(?:,\d{3})*)',
-            r'around\s*\$?(\d+(?:,\d{3})*)',
-            r'about\s*\$?(\d+(?:,\d{3})*)',
-            r'budget.*?\$?(\d+(?:,\d{3})*)',
-            r'(\d+(?:,\d{3})*)\s*buck',
-            r'up\s+to\s*\$?(\d+(?:,\d{3})*)'
-        ]
-        
-        for pattern in budget_patterns:
-            match = re.search(pattern, message_lower)
-            if match:
-                extracted_data['budget'] = match.group(1).replace(',', '')
-                break
-                
-        # Extract product interest from knowledge base categories
-        product_categories = self.knowledge_base.get("product_categories", {})
-        for category, info in product_categories.items():
-            brands = info.get("popular_brands", [])
-            if category in message_lower:
-                extracted_data['product_interest'] = category
-                break
-            # Check for brand mentions
-            for brand in brands:
-                if brand.lower() in message_lower:
-                    extracted_data['product_interest'] = category
+        # Every budget pattern needs a digit; skip them all in one pass when there is none
+        if _DIGIT_RE.search(message):
+            for budget_re in _BUDGET_RES:
+                match = budget_re.search(message)
+                if match:
+                    extracted_data['budget'] = match.group(1).replace(',', '')
                     break
+                
+        # Extract product interest from knowledge base categories and brands
+        if message_lower is None:
+            message_lower = message.lower()
+        product_interest = self._match_product_category(message_lower)
+        if product_interest:
+            extracted_data['product_interest'] = product_interest
                     
         # Extract use case with expanded patterns
-        use_case_patterns = {
-            "business": [r'\b(business|work|office|professional|corporate)\b'],
-            "gaming": [r'\b(gaming|game|gamer|esports|streaming)\b'],
-            "education": [r'\b(school|student|education|study|learning|college)\b'],
-            "creative": [r'\b(design|photo|video|creative|art|editing)\b'],
-            "personal": [r'\b(personal|home|family|casual|everyday)\b'],
-            "fitness": [r'\b(fitness|workout|exercise|health|running)\b']
-        }
-        
-        for use_case, patterns in use_case_patterns.items():
-            if any(re.search(pattern, message_lower) for pattern in patterns):
+        for use_case, patterns in _USE_CASE_RES.items():
+            if any(r.search(message) for r in patterns):
                 extracted_data['use_case'] = use_case
                 break
                 
         # Extract timeline information
-        timeline_patterns = {
-            "immediate": [r'\b(now|today|asap|immediately|urgent)\b'],
-            "this_week": [r'\b(this\s+week|within\s+a\s+week|soon)\b'],
-            "this_month": [r'\b(this\s+month|within\s+a\s+month)\b'],
-            "researching": [r'\b(research|looking|browsing|comparing|just\s+checking)\b']
-        }
-        
-        for timeline, patterns in timeline_patterns.items():
-            if any(re.search(pattern, message_lower) for pattern in patterns):
+        for timeline, patterns in _TIMELINE_RES.items():
+            if any(r.search(message) for r in patterns):
                 extracted_data['timeline'] = timeline
                 break
                 
@@ -207,24 +373,55 @@ class EnhancedSBDRAgent:
     def get_or_create_user_profile(self, session_id: str, name: str = "Guest", 
                                  email: Optional[str] = None) -> UserProfile:
         """Get existing user profile or create a new one."""
-        if session_id not in self.user_profiles:
-            self.user_profiles[session_id] = UserProfile(
+        now = time.monotonic()
+        profile = self.user_profiles.get(session_id)
+        if profile is None:
+            profile = self.user_profiles[session_id] = UserProfile(
                 session_id=session_id,
                 name=name,
                 email=email
             )
-        return self.user_profiles[session_id]
+            self._evict_sessions(now)
+        else:
+            self.user_profiles.move_to_end(session_id)
+        self._last_seen[session_id] = now
+        return profile
+    
+    def _evict_sessions(self, now: float) -> None:
+        """Drop idle sessions and the least recently used ones beyond max_sessions."""
+        profiles = self.user_profiles
+        while profiles:
+            oldest = next(iter(profiles))
+            idle = now - self._last_seen.get(oldest, now)
+            if len(profiles) <= self.max_sessions and (
+                    self.session_ttl is None or idle <= self.session_ttl):
+                break
+            del profiles[oldest]
+            self._last_seen.pop(oldest, None)
     
     def update_user_profile(self, session_id: str, extracted_data: Dict[str, str]) -> None:
         """Update user profile with extracted qualification data."""
+        if not extracted_data:
+            # Nothing changed, so the qualification status cannot change either
+            return
         if session_id in self.user_profiles:
             profile = self.user_profiles[session_id]
             
             # Update profile fields
-            for field in ['budget', 'product_interest', 'use_case', 'timeline']:
-                if field in extracted_data:
-                    setattr(profile, field, extracted_data[field])
-                    profile.engagement_score += 1
+            gained = 0
+            if (value := extracted_data.get('budget')) is not None:
+                profile.budget = value
+                gained += 1
+            if (value := extracted_data.get('product_interest')) is not None:
+                profile.product_interest = value
+                gained += 1
+            if (value := extracted_data.get('use_case')) is not None:
+                profile.use_case = value
+                gained += 1
+            if (value := extracted_data.get('timeline')) is not None:
+                profile.timeline = value
+                gained += 1
+            profile.engagement_score += gained
                     
             # Update qualification status
             qualification_fields = [profile.budget, profile.product_interest, profile.use_case]
@@ -238,14 +435,8 @@ class EnhancedSBDRAgent:
                 profile.qualification_status = QualificationStatus.COMPLETED
                 
                 # Determine if qualified based on criteria
-                escalation_criteria = self.knowledge_base.get("escalation_criteria", {})
-                qualified_criteria = escalation_criteria.get("qualified_lead", {})
-                
                 try:
-                    budget_value = int(profile.budget) if profile.budget else 0
-                    min_budget = qualified_criteria.get("budget_minimum", 100)
-                    
-                    if (budget_value >= min_budget and 
+                    if (profile.budget_value() >= self._qualified_min_budget and 
                         profile.product_interest and 
                         profile.engagement_score >= 2):
                         profile.qualification_status = QualificationStatus.QUALIFIED
@@ -254,23 +445,31 @@ class EnhancedSBDRAgent:
                 except (ValueError, TypeError):
                     profile.qualification_status = QualificationStatus.IN_PROGRESS
     
+    def _pick_question(self, profile: UserProfile, bank: List[str]) -> str:
+        """Pick a question from a bank, rotating through it per profile."""
+        if self.randomize_questions:
+            return random.choice(bank)
+        question = bank[profile.question_cursor % len(bank)]
+        profile.question_cursor += 1
+        return question
+    
     def generate_qualification_questions(self, profile: UserProfile, intent: Intent) -> List[str]:
         """Generate contextual qualification questions."""
         questions = []
-        question_bank = self.knowledge_base.get("qualification_questions", {})
+        question_bank = self._question_bank
         
         if not profile.product_interest:
             if intent == Intent.PRODUCT_INQUIRY:
                 questions.append("What specific type of product are you looking for?")
             else:
-                questions.append(random.choice(
-                    question_bank.get("product_questions", 
+                questions.append(self._pick_question(
+                    profile, question_bank.get("product_questions", 
                     ["What type of product interests you most?"])
                 ))
                 
         if not profile.budget:
-            questions.append(random.choice(
-                question_bank.get("budget_questions", 
+            questions.append(self._pick_question(
+                profile, question_bank.get("budget_questions", 
                 ["What's your approximate budget?"])
             ))
             
@@ -278,80 +477,78 @@ class EnhancedSBDRAgent:
             if profile.product_interest:
                 questions.append(f"What will you primarily use the {profile.product_interest} for?")
             else:
-                questions.append(random.choice(
-                    question_bank.get("use_case_questions", 
+                questions.append(self._pick_question(
+                    profile, question_bank.get("use_case_questions", 
                     ["What will you primarily use this for?"])
                 ))
                 
         if not profile.timeline and len(questions) < 2:
-            questions.append(random.choice(
-                question_bank.get("timeline_questions", 
+            questions.append(self._pick_question(
+                profile, question_bank.get("timeline_questions", 
                 ["When are you looking to make this purchase?"])
             ))
                 
         return questions[:2]  # Limit to 2 questions to avoid overwhelming
     
-    def query_knowledge_base(self, query: str) -> Optional[str]:
+    def query_knowledge_base(self, query: str, query_lower: Optional[str] = None) -> Optional[str]:
         """Enhanced knowledge base querying with better matching."""
-        query_lower = query.lower()
-        policies = self.knowledge_base.get("policies", {})
+        if query_lower is None:
+            query_lower = query.lower()
+        kb_index = self._kb_index
         
-        # Direct policy matching
-        policy_keywords = {
-            "shipping": ["ship", "delivery", "arrive", "fast"],
-            "return": ["return", "refund", "exchange"],
-            "warranty": ["warranty", "guarantee", "protection"],
-            "payment": ["payment", "pay", "credit", "paypal"],
-            "price_matching": ["price match", "match price", "competitor"]
-        }
-        
-        for policy_key, keywords in policy_keywords.items():
-            if any(keyword in query_lower for keyword in keywords):
-                policy_name = f"{policy_key}_policy" if policy_key != "price_matching" else policy_key
-                if policy_name in policies:
-                    return policies[policy_name]
+        # Direct policy matching; the first policy in priority order wins
+        policy_rank = min(
+            _iter_keyword_hits(kb_index.policy_ac, kb_index.policy_keywords, query_lower),
+            default=None
+        )
+        if policy_rank is not None:
+            return self._policies[kb_index.policy_names[policy_rank]]
         
-        # Product category information
-        product_categories = self.knowledge_base.get("product_categories", {})
-        for category, info in product_categories.items():
-            if category in query_lower:
-                description = info.get("description", "")
-                price_range = info.get("price_range", "")
-                brands = ", ".join(info.get("popular_brands", [])[:3])
-                
-                return f"{description} Price range: {price_range}. Popular brands include: {brands}."
+        # Product category information; the first category in knowledge base order wins
+        category_index = min(
+            (categories[0] for categories, _ in
+             _iter_keyword_hits(kb_index.product_ac, kb_index.product_keywords, query_lower)
+             if categories),
+            default=None
+        )
+        if category_index is not None:
+            info = self._product_categories[kb_index.product_category_names[category_index]]
+            description = info.get("description", "")
+            price_range = info.get("price_range", "")
+            brands = ", ".join(info.get("popular_brands", [])[:3])
+            
+            return f"{description} Price range: {price_range}. Popular brands include: {brands}."
         
         return None
     
     def should_handoff(self, profile: UserProfile, intent: Intent) -> bool:
         """Determine if conversation should be handed off to human agent."""
-        escalation_criteria = self.knowledge_base.get("escalation_criteria", {})
-        
         # Immediate handoff triggers
-        immediate_triggers = escalation_criteria.get("immediate_handoff", {})
-        if intent == Intent.HANDOFF_REQUEST:
+        if intent is Intent.HANDOFF_REQUEST:
             return True
-            
+        
+        status = profile.qualification_status
         # Qualified lead handoff
-        if profile.qualification_status == QualificationStatus.QUALIFIED:
+        if status is QualificationStatus.QUALIFIED:
             return True
             
         # Complex inquiry handoff
-        if (len(profile.conversation_history) > 5 and 
-            profile.qualification_status == QualificationStatus.COMPLETED):
+        if (status is QualificationStatus.COMPLETED and
+            len(profile.conversation_history) > 5):
             return True
             
         # High engagement but unqualified
-        if (profile.engagement_score > 3 and 
-            profile.qualification_status == QualificationStatus.UNQUALIFIED):
+        if (status is QualificationStatus.UNQUALIFIED and
+            profile.engagement_score > 3):
             return True
             
         return False
     
     def generate_response(self, session_id: str, message: str, ai_response: str) -> Dict[str, Any]:
         """Generate comprehensive response with all context."""
+        message_lower = message.lower()
         intent = self.detect_intent(message)
-        extracted_data = self.extract_qualification_data(message)
+        extracted_data = self.extract_qualification_data(message, message_lower)
         
         # Get or create user profile
         profile = self.get_or_create_user_profile(session_id)
@@ -360,49 +557,41 @@ class EnhancedSBDRAgent:
         self.update_user_profile(session_id, extracted_data)
         
         # Add message to conversation history
+        profile.intent_set.add(intent.value)
+        profile.message_count += 1
         profile.conversation_history.append({
             "message": message,
             "intent": intent.value,
             "extracted_data": extracted_data,
-            "timestamp": "now"
+            "timestamp": _now()
         })
         
         # Check knowledge base first
-        kb_answer = self.query_knowledge_base(message)
-        if kb_answer:
-            final_response = kb_answer
-        else:
-            # Use AI response with potential enhancements
-            common_responses = self.knowledge_base.get("common_responses", {})
-            if intent.value in common_responses:
-                # Optionally enhance AI response with template
-                final_response = ai_response
-            else:
-                final_response = ai_response
+        kb_answer = self.query_knowledge_base(message, message_lower)
+        # Fall back to the AI response; response blocks are joined once at the end
+        parts = [kb_answer or ai_response]
         
         # Add qualification questions if needed
         needs_qualification = (
-            profile.qualification_status in [QualificationStatus.NOT_STARTED, QualificationStatus.IN_PROGRESS] and
-            intent in [Intent.PRODUCT_INQUIRY, Intent.PRICING, Intent.GENERAL, Intent.GREETING]
+            profile.qualification_status in _PENDING_STATUSES and
+            intent in _QUALIFY_INTENTS
         )
         
         qualification_questions = []
         if needs_qualification:
             qualification_questions = self.generate_qualification_questions(profile, intent)
             if qualification_questions:
-                final_response += "\n\n" + "\n".join(qualification_questions)
+                parts.append("\n".join(qualification_questions))
         
         # Determine handoff need
         needs_handoff = self.should_handoff(profile, intent)
         
         if needs_handoff:
-            handoff_messages = self.knowledge_base.get("common_responses", {}).get("handoff_triggers", [
-                "Let me connect you with one of our specialists who can provide more detailed assistance."
-            ])
-            final_response += "\n\n" + random.choice(handoff_messages)
+            parts.append(self._handoff_messages[self._handoff_cursor % len(self._handoff_messages)])
+            self._handoff_cursor += 1
         
         return {
-            "final_response": final_response,
+            "final_response": "\n\n".join(parts),
             "intent": intent.value,
             "qualification_status": profile.qualification_status.value,
             "needs_qualification": needs_qualification,
@@ -424,11 +613,21 @@ class EnhancedSBDRAgent:
             return {
                 "session_id": session_id,
                 "qualification_status": profile.qualification_status.value,
-                "user_data": asdict(profile),
+                "user_data": {
+                    "session_id": profile.session_id,
+                    "name": profile.name,
+                    "email": profile.email,
+                    "budget": profile.budget,
+                    "product_interest": profile.product_interest,
+                    "use_case": profile.use_case,
+                    "timeline": profile.timeline,
+                    "qualification_status": profile.qualification_status,
+                    "engagement_score": profile.engagement_score
+                },
                 "conversation_summary": {
-                    "total_messages": len(profile.conversation_history),
+                    "total_messages": profile.message_count,
                     "engagement_score": profile.engagement_score,
-                    "key_intents": list(set([msg.get("intent") for msg in profile.conversation_history]))
+                    "key_intents": list(profile.intent_set)
                 }
             }
         return {}
@@ -5,11 +5,19 @@ for the Sales Business Development Representative conversational agent.
 """
 
 import re
-import json
-from typing import Dict, List, Tuple, Optional
+import functools
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Tuple, Optional
 from dataclasses import dataclass
 from enum import Enum
 
+try:
+    import ahocorasick
+except ImportError:  # optional accelerator; falls back to substring checks
+    ahocorasick = None
+
 class Intent(Enum):
     GREETING = "greeting"
     PRODUCT_INQUIRY = "product_inquiry"
@@ -20,6 +28,10 @@ class Intent(Enum):
     HANDOFF_REQUEST = "handoff_request"
     QUALIFICATION_RESPONSE = "qualification_response"
     GENERAL = "general"
+    
+    # Members are singletons, so identity hashing is consistent with equality
+    # and keeps set/dict lookups in C instead of Enum.__hash__
+    __hash__ = object.__hash__
 
 class QualificationStatus(Enum):
     NOT_STARTED = "not_started"
@@ -27,8 +39,122 @@ class QualificationStatus(Enum):
     COMPLETED = "completed"
     QUALIFIED = "qualified"
     UNQUALIFIED = "unqualified"
+    
+    __hash__ = object.__hash__
+
+# Intents and statuses that call for qualification questions
+_QUALIFY_INTENTS = frozenset({Intent.PRODUCT_INQUIRY, Intent.PRICING, Intent.GENERAL})
+_PENDING_STATUSES = frozenset({QualificationStatus.NOT_STARTED, QualificationStatus.IN_PROGRESS})
+
+# Intent keywords in priority order; the first intent with a matching keyword wins
+_INTENT_KEYWORDS = (
+    (Intent.GREETING, ("hello", "hi", "hey", "good morning", "good afternoon", "good evening")),
+    (Intent.PRODUCT_INQUIRY, ("laptop", "phone", "smartphone", "tablet", "headphones", "smartwatch",
+                              "computer", "monitor", "keyboard", "mouse", "speaker", "camera")),
+    (Intent.PRICING, ("price", "cost", "budget", "how much", "expensive", "cheap", "affordable")),
+    (Intent.ORDER_STATUS, ("order", "tracking", "delivery", "shipped", "status")),
+    (Intent.SHIPPING, ("shipping", "delivery", "when will", "how long", "arrive")),
+    (Intent.SUPPORT, ("help", "support", "problem", "issue", "broken", "not working")),
+    (Intent.HANDOFF_REQUEST, ("human", "agent", "representative", "person", "speak to someone")),
+)
+
+# Product and use-case keywords; the first category with a matching keyword wins
+_PRODUCT_KEYWORDS = (
+    ("laptop", ("laptop", "notebook", "computer")),
+    ("smartphone", ("phone", "smartphone", "mobile")),
+    ("tablet", ("tablet", "ipad")),
+    ("headphones", ("headphones", "earbuds", "earphones")),
+    ("smartwatch", ("watch", "smartwatch", "wearable")),
+    ("monitor", ("monitor", "display", "screen")),
+    ("gaming", ("gaming", "game", "gamer")),
+)
+_USE_CASE_KEYWORDS = (
+    ("business", ("business", "work", "office", "professional")),
+    ("gaming", ("gaming", "game", "gamer", "esports")),
+    ("education", ("school", "student", "education", "study")),
+    ("creative", ("design", "photo", "video", "creative", "art")),
+    ("personal", ("personal", "home", "family", "casual")),
+)
+
+# Knowledge base keyword aliases, checked after the full topic names
+_KB_KEYWORD_MAPPING = {
+    "ship": "shipping_policy",
+    "return": "return_policy",
+    "warranty": "warranty",
+    "payment": "payment_methods",
+    "hours": "store_hours",
+    "price match": "price_matching",
+    "bulk": "bulk_orders",
+    "support": "technical_support"
+}
+
+def _build_rank_automaton(table: Tuple[Tuple[Any, Tuple[str, ...]], ...]) -> Any:
+    """Build an Aho-Corasick automaton mapping each keyword in table to its entry's rank."""
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    # Adding in reverse leaves shared keywords on the higher-priority entry
+    for rank in range(len(table) - 1, -1, -1):
+        for keyword in table[rank][1]:
+            automaton.add_word(keyword, rank)
+    automaton.make_automaton()
+    return automaton
+
+def _first_ranked_match(automaton: Any, table: Tuple[Tuple[Any, Tuple[str, ...]], ...], text: str) -> Any:
+    """Return the first entry of table with a keyword in text, or None."""
+    if automaton is not None:
+        # One pass over the text; keep the highest-priority entry seen
+        best_rank = len(table)
+        for _, rank in automaton.iter(text):
+            if rank < best_rank:
+                best_rank = rank
+                if rank == 0:
+                    break
+        return table[best_rank][0] if best_rank < len(table) else None
+    for value, keywords in table:
+        if any(keyword in text for keyword in keywords):
+            return value
+    return None
+
+def _build_extraction_automaton() -> Any:
+    """Build one automaton mapping each product/use-case keyword to its rank in both tables.
+    
+    A keyword missing from a table gets that table's length as its rank, so it
+    never wins there.
+    """
+    if ahocorasick is None:
+        return None
+    ranks: Dict[str, List[int]] = {}
+    for slot, table in enumerate((_PRODUCT_KEYWORDS, _USE_CASE_KEYWORDS)):
+        for rank in range(len(table) - 1, -1, -1):
+            for keyword in table[rank][1]:
+                ranks.setdefault(keyword, [len(_PRODUCT_KEYWORDS), len(_USE_CASE_KEYWORDS)])[slot] = rank
+    automaton = ahocorasick.Automaton()
+    for keyword, (product_rank, use_case_rank) in ranks.items():
+        automaton.add_word(keyword, (product_rank, use_case_rank))
+    automaton.make_automaton()
+    return automaton
+
+# Only the most recent messages are kept per profile
+_HISTORY_MAXLEN = 64
+
+# Budget patterns, tried in order against the lowercased message
+_DIGIT_RE = re.compile(r'\d')
+_BUDGET_RES = tuple(re.compile(p) for p in (
+    r'\$(\d+(?:,\d{3})*(?:\.\d{2})?)',  # $1,000.00 format
+    r'(\d+(?:,\d{3})*)\s*dollars?',      # 1000 dollars format
+    r'under\s*\$?(\d+(?:,\d{3})*)',      # under $500 format
+    r'around\s*\$?(\d+(?:,\d{3})*)',     # around $300 format
+    r'budget[^\d\n]*(\d+(?:,\d{3})*)',   # budget is $400 format
+))
 
-@dataclass
+class HistoryEntry(NamedTuple):
+    message: str
+    intent: str
+    extracted_data: Dict[str, str]
+    timestamp: float
+
+@dataclass(slots=True)
 class UserProfile:
     session_id: str
     name: str = "Guest"
@@ -37,13 +163,13 @@ class UserProfile:
     product_interest: Optional[str] = None
     use_case: Optional[str] = None
     qualification_status: QualificationStatus = QualificationStatus.NOT_STARTED
-    conversation_history: List[Dict] = None
+    conversation_history: Deque[HistoryEntry] = None
     
     def __post_init__(self):
         if self.conversation_history is None:
-            self.conversation_history = []
+            self.conversation_history = deque(maxlen=_HISTORY_MAXLEN)
 
-@dataclass
+@dataclass(slots=True)
 class QualificationCriteria:
     min_budget: int = 100
     target_products: List[str] = None
@@ -55,11 +181,67 @@ class QualificationCriteria:
         if self.priority_use_cases is None:
             self.priority_use_cases = ["business", "gaming", "professional", "work", "education"]
 
+def _needs_handoff(intent: Intent, status: QualificationStatus, long_history: bool) -> bool:
+    """Handoff rule: explicit request, qualified lead, or a long completed conversation."""
+    return (
+        intent is Intent.HANDOFF_REQUEST or
+        status is QualificationStatus.QUALIFIED or
+        (status is QualificationStatus.COMPLETED and long_history)
+    )
+
+# The rule tabulated over its whole domain (9 intents x 5 statuses x 2)
+_HANDOFF_TABLE = {
+    (intent, status, long_history): _needs_handoff(intent, status, long_history)
+    for intent in Intent
+    for status in QualificationStatus
+    for long_history in (False, True)
+}
+
+_INTENT_AC = _build_rank_automaton(_INTENT_KEYWORDS)
+_INTENT_CACHE_MAX_LEN = 256
+
+def _match_intent(message_lower: str) -> Intent:
+    """Return the highest-priority intent with a keyword in the lowercased message."""
+    intent = _first_ranked_match(_INTENT_AC, _INTENT_KEYWORDS, message_lower)
+    return intent if intent is not None else Intent.GENERAL
+
+_match_intent_cached = functools.lru_cache(maxsize=4096)(_match_intent)
+
+@functools.lru_cache(maxsize=256)
+def _qualification_questions(product_interest: Optional[str], has_budget: bool,
+                             has_use_case: bool, product_inquiry: bool) -> Tuple[str, ...]:
+    """Build the questions for one profile state; there are only a few dozen distinct states."""
+    questions = []
+    
+    if not product_interest:
+        if product_inquiry:
+            questions.append("What type of product are you looking for today?")
+        else:
+            questions.append("Are you interested in any particular product category? (laptops, smartphones, tablets, etc.)")
+            
+    if not has_budget:
+        questions.append("What's your approximate budget for this purchase?")
+        
+    if not has_use_case:
+        if product_interest:
+            questions.append(f"What will you primarily use the {product_interest} for?")
+        else:
+            questions.append("What will you primarily use this product for? (work, gaming, personal use, etc.)")
+            
+    return tuple(questions)
+
 class SBDRAgent:
     def __init__(self):
         self.qualification_criteria = QualificationCriteria()
         self.user_profiles: Dict[str, UserProfile] = {}
+        self._create_lock = threading.Lock()
         self.knowledge_base = self._load_knowledge_base()
+        self._extraction_ac = _build_extraction_automaton()
+        # Full topic names take priority over the keyword aliases
+        self._kb_keywords = tuple(
+            (key, (key.replace('_', ' '),)) for key in self.knowledge_base
+        ) + tuple((key, (keyword,)) for keyword, key in _KB_KEYWORD_MAPPING.items())
+        self._kb_ac = _build_rank_automaton(self._kb_keywords)
         
     def _load_knowledge_base(self) -> Dict[str, str]:
         """Load the knowledge base with common questions and answers."""
@@ -74,110 +256,71 @@ class SBDRAgent:
             "technical_support": "Technical support is available for all purchased products. Contact us via chat, email, or phone for assistance."
         }
     
-    def detect_intent(self, message: str) -> Intent:
+    def detect_intent(self, message: str, message_lower: Optional[str] = None) -> Intent:
         """Detect the intent of the user's message using keyword matching."""
-        message_lower = message.lower()
+        if message_lower is None:
+            message_lower = message.lower()
         
-        # Greeting patterns
-        greeting_patterns = ["hello", "hi", "hey", "good morning", "good afternoon", "good evening"]
-        if any(pattern in message_lower for pattern in greeting_patterns):
-            return Intent.GREETING
-            
-        # Product inquiry patterns
-        product_patterns = ["laptop", "phone", "smartphone", "tablet", "headphones", "smartwatch", 
-                          "computer", "monitor", "keyboard", "mouse", "speaker", "camera"]
-        if any(pattern in message_lower for pattern in product_patterns):
-            return Intent.PRODUCT_INQUIRY
-            
-        # Pricing patterns
-        pricing_patterns = ["price", "cost", "budget", "how much", "expensive", "cheap", "affordable"]
-        if any(pattern in message_lower for pattern in pricing_patterns):
-            return Intent.PRICING
-            
-        # Order status patterns
-        order_patterns = ["order", "tracking", "delivery", "shipped", "status"]
-        if any(pattern in message_lower for pattern in order_patterns):
-            return Intent.ORDER_STATUS
-            
-        # Shipping patterns
-        shipping_patterns = ["shipping", "delivery", "when will", "how long", "arrive"]
-        if any(pattern in message_lower for pattern in shipping_patterns):
-            return Intent.SHIPPING
-            
-        # Support patterns
-        support_patterns = ["help", "support", "problem", "issue", "broken", "not working"]
-        if any(pattern in message_lower for pattern in support_patterns):
-            return Intent.SUPPORT
-            
-        # Handoff request patterns
-        handoff_patterns = ["human", "agent", "representative", "person", "speak to someone"]
-        if any(pattern in message_lower for pattern in handoff_patterns):
-            return Intent.HANDOFF_REQUEST
-            
-        return Intent.GENERAL
+        # Repeat traffic ("hi", "help") is short; long messages would only churn the cache
+        if len(message_lower) <= _INTENT_CACHE_MAX_LEN:
+            return _match_intent_cached(message_lower)
+        return _match_intent(message_lower)
     
-    def extract_qualification_data(self, message: str) -> Dict[str, Optional[str]]:
+    def extract_qualification_data(self, message: str,
+                                   message_lower: Optional[str] = None) -> Dict[str, Optional[str]]:
         """Extract qualification data from user messages."""
-        message_lower = message.lower()
+        if message_lower is None:
+            message_lower = message.lower()
         extracted_data = {}
         
-        # Extract budget information
-        budget_patterns = [
-            r'\$(\d+(?:,\d{3})*(?:\.\d{2})?)',  # $1,000.00 format
-            r'(\d+(?:,\d{3})*)\s*dollars?',      # 1000 dollars format
-            r'under\s*\$?(\d+(?:,\d{3})*)',      # under $500 format
-            r'around\s*\$?(\d+(?:,\d{3})*)',     # around $300 format
-            r'budget.*?\$?(\d+(?:,\d{3})*)',     # budget is $400 format
-        ]
-        
-        for pattern in budget_patterns:
-            match = re.search(pattern, message_lower)
-            if match:
-                extracted_data['budget'] = match.group(1)
-                break
+        # Extract budget information; every pattern needs a digit, so one scan
+        # rules them all out for most messages
+        if _DIGIT_RE.search(message_lower):
+            for budget_re in _BUDGET_RES:
+                match = budget_re.search(message_lower)
+                if match:
+                    extracted_data['budget'] = match.group(1)
+                    break
                 
-        # Extract product interest
-        product_keywords = {
-            "laptop": ["laptop", "notebook", "computer"],
-            "smartphone": ["phone", "smartphone", "mobile"],
-            "tablet": ["tablet", "ipad"],
-            "headphones": ["headphones", "earbuds", "earphones"],
-            "smartwatch": ["watch", "smartwatch", "wearable"],
-            "monitor": ["monitor", "display", "screen"],
-            "gaming": ["gaming", "game", "gamer"]
-        }
-        
-        for product, keywords in product_keywords.items():
-            if any(keyword in message_lower for keyword in keywords):
-                extracted_data['product_interest'] = product
-                break
-                
-        # Extract use case
-        use_case_keywords = {
-            "business": ["business", "work", "office", "professional"],
-            "gaming": ["gaming", "game", "gamer", "esports"],
-            "education": ["school", "student", "education", "study"],
-            "creative": ["design", "photo", "video", "creative", "art"],
-            "personal": ["personal", "home", "family", "casual"]
-        }
-        
-        for use_case, keywords in use_case_keywords.items():
-            if any(keyword in message_lower for keyword in keywords):
-                extracted_data['use_case'] = use_case
-                break
+        # Extract product interest and use case
+        product, use_case = self._match_extraction_keywords(message_lower)
+        if product is not None:
+            extracted_data['product_interest'] = product
+        if use_case is not None:
+            extracted_data['use_case'] = use_case
                 
         return extracted_data
     
+    def _match_extraction_keywords(self, message_lower: str) -> Tuple[Optional[str], Optional[str]]:
+        """Return the (product, use case) named in the message, scanning it only once."""
+        if self._extraction_ac is None:
+            return (_first_ranked_match(None, _PRODUCT_KEYWORDS, message_lower),
+                    _first_ranked_match(None, _USE_CASE_KEYWORDS, message_lower))
+        
+        product_rank = len(_PRODUCT_KEYWORDS)
+        use_case_rank = len(_USE_CASE_KEYWORDS)
+        for _, (p_rank, u_rank) in self._extraction_ac.iter(message_lower):
+            if p_rank < product_rank:
+                product_rank = p_rank
+            if u_rank < use_case_rank:
+                use_case_rank = u_rank
+        # Messages without any keyword (greetings, handoffs) end here after one pass
+        return (_PRODUCT_KEYWORDS[product_rank][0] if product_rank < len(_PRODUCT_KEYWORDS) else None,
+                _USE_CASE_KEYWORDS[use_case_rank][0] if use_case_rank < len(_USE_CASE_KEYWORDS) else None)
+    
     def get_or_create_user_profile(self, session_id: str, name: str = "Guest", 
                                  email: Optional[str] = None) -> UserProfile:
         """Get existing user profile or create a new one."""
-        if session_id not in self.user_profiles:
-            self.user_profiles[session_id] = UserProfile(
-                session_id=session_id,
-                name=name,
-                email=email
-            )
-        return self.user_profiles[session_id]
+        profile = self.user_profiles.get(session_id)
+        if profile is None:
+            # Only creation is locked; setdefault keeps the first profile if two threads race
+            with self._create_lock:
+                profile = self.user_profiles.setdefault(session_id, UserProfile(
+                    session_id=session_id,
+                    name=name,
+                    email=email
+                ))
+        return profile
     
     def update_user_profile(self, session_id: str, extracted_data: Dict[str, str]) -> None:
         """Update user profile with extracted qualification data."""
@@ -210,55 +353,29 @@ class SBDRAgent:
     
     def generate_qualification_questions(self, profile: UserProfile, intent: Intent) -> List[str]:
         """Generate appropriate qualification questions based on user profile and intent."""
-        questions = []
-        
-        if not profile.product_interest:
-            if intent == Intent.PRODUCT_INQUIRY:
-                questions.append("What type of product are you looking for today?")
-            else:
-                questions.append("Are you interested in any particular product category? (laptops, smartphones, tablets, etc.)")
-                
-        if not profile.budget:
-            questions.append("What's your approximate budget for this purchase?")
-            
-        if not profile.use_case:
-            if profile.product_interest:
-                questions.append(f"What will you primarily use the {profile.product_interest} for?")
-            else:
-                questions.append("What will you primarily use this product for? (work, gaming, personal use, etc.)")
-                
-        return questions
+        product_interest = profile.product_interest or None
+        return list(_qualification_questions(
+            product_interest,
+            bool(profile.budget),
+            bool(profile.use_case),
+            product_interest is None and intent is Intent.PRODUCT_INQUIRY
+        ))
     
-    def query_knowledge_base(self, query: str) -> Optional[str]:
+    def query_knowledge_base(self, query: str, query_lower: Optional[str] = None) -> Optional[str]:
         """Query the knowledge base for relevant information."""
-        query_lower = query.lower()
-        
-        for key, answer in self.knowledge_base.items():
-            if key.replace('_', ' ') in query_lower:
-                return answer
-                
-        # Keyword-based matching
-        keyword_mapping = {
-            "ship": "shipping_policy",
-            "return": "return_policy",
-            "warranty": "warranty",
-            "payment": "payment_methods",
-            "hours": "store_hours",
-            "price match": "price_matching",
-            "bulk": "bulk_orders",
-            "support": "technical_support"
-        }
+        if query_lower is None:
+            query_lower = query.lower()
         
-        for keyword, key in keyword_mapping.items():
-            if keyword in query_lower:
-                return self.knowledge_base[key]
-                
+        key = _first_ranked_match(self._kb_ac, self._kb_keywords, query_lower)
+        if key is not None:
+            return self.knowledge_base[key]
         return None
     
     def generate_response(self, session_id: str, message: str, ai_response: str) -> Dict[str, any]:
         """Generate the final response including qualification questions if needed."""
-        intent = self.detect_intent(message)
-        extracted_data = self.extract_qualification_data(message)
+        message_lower = message.lower()
+        intent = self.detect_intent(message, message_lower)
+        extracted_data = self.extract_qualification_data(message, message_lower)
         
         # Get or create user profile
         profile = self.get_or_create_user_profile(session_id)
@@ -267,24 +384,22 @@ class SBDRAgent:
         self.update_user_profile(session_id, extracted_data)
         
         # Add message to conversation history
-        profile.conversation_history.append({
-            "message": message,
-            "intent": intent.value,
-            "extracted_data": extracted_data,
-            "timestamp": "now"  # In real implementation, use actual timestamp
-        })
+        profile.conversation_history.append(
+            HistoryEntry(message, intent.value, extracted_data, time.time())
+        )
         
         # Check if knowledge base can answer the question
-        kb_answer = self.query_knowledge_base(message)
+        kb_answer = self.query_knowledge_base(message, message_lower)
         if kb_answer:
             final_response = kb_answer
         else:
             final_response = ai_response
             
         # Add qualification questions if needed
+        # Intent is checked first so greetings and handoff requests skip the status check
         needs_qualification = (
-            profile.qualification_status in [QualificationStatus.NOT_STARTED, QualificationStatus.IN_PROGRESS] and
-            intent in [Intent.PRODUCT_INQUIRY, Intent.PRICING, Intent.GENERAL]
+            intent in _QUALIFY_INTENTS and
+            profile.qualification_status in _PENDING_STATUSES
         )
         
         qualification_questions = []
@@ -294,12 +409,9 @@ class SBDRAgent:
                 final_response += "\n\n" + "\n".join(qualification_questions)
         
         # Determine if handoff is needed
-        needs_handoff = (
-            intent == Intent.HANDOFF_REQUEST or
-            profile.qualification_status == QualificationStatus.QUALIFIED or
-            (profile.qualification_status == QualificationStatus.COMPLETED and 
-             len(profile.conversation_history) > 5)
-        )
+        needs_handoff = _HANDOFF_TABLE[
+            intent, profile.qualification_status, len(profile.conversation_history) > 5
+        ]
         
         return {
             "final_response": final_response,
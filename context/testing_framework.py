@@ -12,7 +12,7 @@ from unittest.mock import Mock, patch
 import logging
 
 # Import our SBDR agent logic
-from enhanced_sbdr_logic import EnhancedSBDRAgent, Intent, QualificationStatus
+from enhanced_sbdr_logic import EnhancedSBDRAgent, Intent, QualificationStatus, UserProfile
 
 class SBDRAgentTestCase(unittest.TestCase):
     """Test cases for the SBDR agent logic."""
@@ -39,6 +39,22 @@ class SBDRAgentTestCase(unittest.TestCase):
                 detected_intent = self.agent.detect_intent(message)
                 self.assertEqual(detected_intent, expected_intent)
     
+    def test_batch_intent_classification(self):
+        """Test batch intent detection matches per-message detection."""
+        messages = [
+            "Hello, how are you?",
+            "I'm looking for a laptop",
+            "Where is my order?",
+            "Hello, how are you?",
+            "What do you sell?"
+        ]
+        
+        intents = self.agent.classify_batch(messages)
+        self.assertEqual(len(intents), len(messages))
+        for message, intent in zip(messages, intents):
+            with self.subTest(message=message):
+                self.assertEqual(intent, self.agent.detect_intent(message))
+    
     def test_qualification_data_extraction(self):
         """Test extraction of qualification data from messages."""
         test_cases = [
@@ -76,6 +92,28 @@ class SBDRAgentTestCase(unittest.TestCase):
         self.assertEqual(updated_profile.use_case, "business")
         self.assertEqual(updated_profile.qualification_status, QualificationStatus.QUALIFIED)
     
+    def test_budget_memo_not_part_of_profile_identity(self):
+        """Test that the parsed-budget memo does not affect equality or repr."""
+        parsed = UserProfile(session_id="memo", budget="1500")
+        unparsed = UserProfile(session_id="memo", budget="1500")
+        
+        self.assertEqual(parsed.budget_value(), 1500)
+        self.assertEqual(parsed, unparsed)
+        self.assertNotIn("_budget", repr(parsed))
+    
+    def test_session_eviction(self):
+        """Test that the profile store stays bounded."""
+        agent = EnhancedSBDRAgent("knowledge_base.json", max_sessions=2)
+        agent.get_or_create_user_profile("session_a")
+        agent.get_or_create_user_profile("session_b")
+        agent.get_or_create_user_profile("session_a")  # refresh session_a
+        agent.get_or_create_user_profile("session_c")
+        
+        self.assertEqual(len(agent.user_profiles), 2)
+        self.assertIn("session_a", agent.user_profiles)
+        self.assertNotIn("session_b", agent.user_profiles)
+        self.assertIn("session_c", agent.user_profiles)
+    
     def test_knowledge_base_queries(self):
         """Test knowledge base query functionality."""
         test_queries = [
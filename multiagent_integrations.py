@@ -5,16 +5,68 @@ Real integrations with Crisp, Shopify, and external AI services.
 
 import asyncio
 import aiohttp
+import base64
 import json
 import logging
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Protocol
+from dataclasses import dataclass, field
 from datetime import datetime
 import os
-from abc import ABC, abstractmethod
+import random
+
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:  # optional accelerator; stdlib json is used instead
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode()
+    _json_loads = json.loads
+
+try:
+    import httpx
+    import h2  # noqa: F401  required by httpx for http2=True
+    _HAS_HTTP2 = True
+except ImportError:  # optional; OpenAI requests go through aiohttp (HTTP/1.1)
+    httpx = None
+    _HAS_HTTP2 = False
+
+try:
+    import aiodns  # noqa: F401  enables aiohttp's non-blocking AsyncResolver
+    _HAS_AIODNS = True
+except ImportError:  # optional; aiohttp falls back to its threaded resolver
+    _HAS_AIODNS = False
 
 logger = logging.getLogger(__name__)
 
+# Responses and transport failures that are worth retrying
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+_RETRYABLE_ERRORS: tuple = (aiohttp.ClientError, asyncio.TimeoutError)
+if httpx is not None:
+    _RETRYABLE_ERRORS += (httpx.TransportError,)
+
+# Shared stand-in for products without variants; only ever read
+_EMPTY_VARIANT: Dict[str, Any] = {}
+
+# GraphQL order display statuses that REST reports as a fulfillment_status;
+# every other state (unfulfilled, in progress, on hold, ...) was null in REST
+_REST_FULFILLMENT_STATUS = {
+    "FULFILLED": "fulfilled",
+    "PARTIALLY_FULFILLED": "partial",
+    "RESTOCKED": "restocked"
+}
+
+def _shop_money(price_set: Optional[Dict]) -> Optional[str]:
+    """Amount string of a GraphQL MoneyBag in the shop's currency"""
+    return (price_set.get("shopMoney") or {}).get("amount") if price_set else None
+
+def _copy_product(product: Dict) -> Dict:
+    """Copy of a cached product; its list fields (images, tags) are copied too"""
+    return {key: list(value) if isinstance(value, list) else value
+            for key, value in product.items()}
+
 # Configuration Classes
 @dataclass
 class CrispConfig:
@@ -28,10 +80,11 @@ class ShopifyConfig:
     shop_domain: str
     access_token: str
     api_version: str = "2023-10"
+    base_url: str = field(init=False)
     
-    @property
-    def base_url(self) -> str:
-        return f"https://{self.shop_domain}.myshopify.com/admin/api/{self.api_version}"
+    def __post_init__(self):
+        # Derived once; every Shopify request URL is built from it
+        self.base_url = f"https://{self.shop_domain}.myshopify.com/admin/api/{self.api_version}"
 
 @dataclass
 class OpenAIConfig:
@@ -39,48 +92,65 @@ class OpenAIConfig:
     model: str = "gpt-3.5-turbo"
     base_url: str = "https://api.openai.com/v1"
 
+# Integration Interface
+class Integration(Protocol):
+    """Structural interface shared by every integration"""
+    
+    async def connect(self) -> None: ...
+    
+    async def aclose(self) -> None: ...
+    
+    async def test_connection(self) -> bool: ...
+
 # Base Integration Class
-class BaseIntegration(ABC):
+class BaseIntegration:
+    # Connection pool sizing; subclasses tune it to their API's realistic concurrency
+    connector_options: Dict[str, Any] = {
+        "limit": 100,
+        "limit_per_host": 30,
+        "ttl_dns_cache": 300,
+        "keepalive_timeout": 75
+    }
+    
     def __init__(self, config: Any):
         self.config = config
         self.session: Optional[aiohttp.ClientSession] = None
-        self._session_created = False
-    
-    async def _ensure_session(self):
-        """Ensure session is created"""
-        if not self.session and not self._session_created:
-            self.session = aiohttp.ClientSession()
-            self._session_created = True
     
-    async def __aenter__(self):
-        await self._ensure_session()
-        return self
+    async def connect(self):
+        """Open the long-lived session; its pooled connections are reused across calls"""
+        if self.session is None:
+            options = dict(self.connector_options)
+            if _HAS_AIODNS:
+                options["resolver"] = aiohttp.AsyncResolver()
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(**options))
     
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
+    async def aclose(self):
+        """Close the session and its pooled connections"""
         if self.session:
             await self.session.close()
             self.session = None
-            self._session_created = False
     
-    @abstractmethod
-    async def test_connection(self) -> bool:
-        """Test if the integration is working"""
-        pass
+    async def _ensure_session(self) -> aiohttp.ClientSession:
+        """Return the session, opening it on first use.
+        
+        Request methods call this only when self.session is unset, so the common
+        path is a single attribute test.
+        """
+        await self.connect()
+        return self.session
 
 # Crisp Integration
 class CrispIntegration(BaseIntegration):
+    connector_options = {**BaseIntegration.connector_options, "limit_per_host": 5}
+    
     def __init__(self, config: CrispConfig):
         super().__init__(config)
         self.config: CrispConfig = config
-    
-    def _get_headers(self) -> Dict[str, str]:
-        """Get authentication headers for Crisp API"""
-        import base64
+        # Authentication headers for Crisp API; built once and reused by every request
         credentials = base64.b64encode(
             f"{self.config.identifier}:{self.config.key}".encode()
         ).decode()
-        
-        return {
+        self._headers = {
             "Authorization": f"Basic {credentials}",
             "Content-Type": "application/json",
             "X-Crisp-Tier": "plugin"
@@ -90,10 +160,11 @@ class CrispIntegration(BaseIntegration):
         """Test Crisp API connection"""
         try:
             url = f"{self.config.base_url}/website/{self.config.website_id}"
-            async with self.session.get(url, headers=self._get_headers()) as response:
+            session = self.session or await self._ensure_session()
+            async with session.get(url, headers=self._headers) as response:
                 return response.status == 200
         except Exception as e:
-            logger.error(f"Crisp connection test failed: {e}")
+            logger.error("Crisp connection test failed: %s", e)
             return False
     
     async def send_message(self, session_id: str, content: str, 
@@ -109,20 +180,21 @@ class CrispIntegration(BaseIntegration):
                 "origin": "chat"
             }
             
-            async with self.session.post(
+            session = self.session or await self._ensure_session()
+            async with session.post(
                 url, 
-                json=payload, 
-                headers=self._get_headers()
+                data=_json_dumps(payload),
+                headers=self._headers
             ) as response:
                 if response.status == 201:
-                    logger.info(f"Message sent to Crisp session {session_id}")
+                    logger.info("Message sent to Crisp session %s", session_id)
                     return True
                 else:
-                    logger.error(f"Failed to send message: {response.status}")
+                    logger.error("Failed to send message: %s", response.status)
                     return False
                     
         except Exception as e:
-            logger.error(f"Error sending Crisp message: {e}")
+            logger.error("Error sending Crisp message: %s", e)
             return False
     
     async def get_conversation_meta(self, session_id: str) -> Optional[Dict]:
@@ -130,13 +202,14 @@ class CrispIntegration(BaseIntegration):
         try:
             url = f"{self.config.base_url}/website/{self.config.website_id}/conversation/{session_id}/meta"
             
-            async with self.session.get(url, headers=self._get_headers()) as response:
+            session = self.session or await self._ensure_session()
+            async with session.get(url, headers=self._headers) as response:
                 if response.status == 200:
-                    return await response.json()
+                    return _json_loads(await response.read())
                 return None
                 
         except Exception as e:
-            logger.error(f"Error getting conversation meta: {e}")
+            logger.error("Error getting conversation meta: %s", e)
             return None
     
     async def update_conversation_state(self, session_id: str, state: str) -> bool:
@@ -146,45 +219,173 @@ class CrispIntegration(BaseIntegration):
             
             payload = {"state": state}
             
-            async with self.session.patch(
+            session = self.session or await self._ensure_session()
+            async with session.patch(
                 url, 
-                json=payload, 
-                headers=self._get_headers()
+                data=_json_dumps(payload),
+                headers=self._headers
             ) as response:
                 return response.status == 200
                 
         except Exception as e:
-            logger.error(f"Error updating conversation state: {e}")
+            logger.error("Error updating conversation state: %s", e)
             return False
 
 # Shopify Integration
 class ShopifyIntegration(BaseIntegration):
+    # Shopify's REST Admin API is rate limited (2 requests/s leaky bucket)
+    connector_options = {**BaseIntegration.connector_options, "limit_per_host": 10}
+    
+    # Cache lifetimes in seconds; product IDs never change so they live longer
+    PRODUCT_SEARCH_TTL = 60
+    PRODUCT_BY_ID_TTL = 300
+    PRODUCT_CACHE_SIZE = 256
+    
+    # Customer lookup and order history in one round-trip. 50 orders matches the
+    # REST orders.json default page; line items past the first page are fetched
+    # with _ORDER_LINE_ITEMS_QUERY so large orders come back complete.
+    # Shopify rejects queries whose requested cost exceeds 1,000 points, and each
+    # connection costs 2 + first per enclosing item: 3 (customers) + 52 (orders)
+    # + 50 x 12 (line items) = 655. A first line item page of 50 would be ~2,655
+    _CUSTOMER_ORDERS_QUERY = """
+    query($q: String!) {
+      customers(first: 1, query: $q) {
+        edges { node {
+          orders(first: 50, sortKey: CREATED_AT, reverse: true) {
+            edges { node {
+              id
+              legacyResourceId
+              name
+              totalPriceSet { shopMoney { amount } }
+              displayFinancialStatus
+              displayFulfillmentStatus
+              createdAt
+              updatedAt
+              lineItems(first: 10) {
+                pageInfo { hasNextPage endCursor }
+                edges { node {
+                  title
+                  quantity
+                  originalUnitPriceSet { shopMoney { amount } }
+                } }
+              }
+            } }
+          }
+        } }
+      }
+    }
+    """
+    
+    # One page of an order's remaining line items: 1 (order) + 252 (line items) = 253 points
+    _ORDER_LINE_ITEMS_QUERY = """
+    query($id: ID!, $after: String) {
+      order(id: $id) {
+        lineItems(first: 250, after: $after) {
+          pageInfo { hasNextPage endCursor }
+          edges { node {
+            title
+            quantity
+            originalUnitPriceSet { shopMoney { amount } }
+          } }
+        }
+      }
+    }
+    """
+    
     def __init__(self, config: ShopifyConfig):
         super().__init__(config)
         self.config: ShopifyConfig = config
-    
-    def _get_headers(self) -> Dict[str, str]:
-        """Get authentication headers for Shopify API"""
-        return {
+        # Authentication headers for Shopify API
+        self._headers = {
             "X-Shopify-Access-Token": self.config.access_token,
             "Content-Type": "application/json"
         }
+        # Fixed endpoint URLs
+        base_url = self.config.base_url
+        self._shop_url = f"{base_url}/shop.json"
+        self._products_url = f"{base_url}/products.json"
+        self._graphql_url = f"{base_url}/graphql.json"
+        # Successful lookups keyed by request arguments -> (stored_at, result)
+        self._product_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        # One lock per in-flight key so concurrent duplicate lookups share a single
+        # request -> [lock, callers holding or waiting on it]
+        self._product_locks: Dict[tuple, list] = {}
+    
+    def _cache_get(self, key: tuple, ttl: float) -> Any:
+        """Return a fresh cached result for key, or None"""
+        entry = self._product_cache.get(key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        if time.monotonic() - stored_at >= ttl:
+            del self._product_cache[key]
+            return None
+        self._product_cache.move_to_end(key)
+        return result
+    
+    def _cache_set(self, key: tuple, result: Any):
+        """Store result for key, evicting the least recently used entry when full"""
+        self._product_cache[key] = (time.monotonic(), result)
+        self._product_cache.move_to_end(key)
+        if len(self._product_cache) > self.PRODUCT_CACHE_SIZE:
+            self._product_cache.popitem(last=False)
+    
+    async def _cached_fetch(self, key: tuple, ttl: float, fetch) -> Any:
+        """Return the cached result for key or await fetch() once for all waiters.
+        
+        fetch returns None for failures, which are not cached.
+        """
+        result = self._cache_get(key, ttl)
+        if result is not None:
+            return result
+        entry = self._product_locks.get(key)
+        if entry is None:
+            entry = self._product_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                # Another waiter may have filled the cache while we queued
+                result = self._cache_get(key, ttl)
+                if result is None:
+                    result = await fetch()
+                    if result is not None:
+                        self._cache_set(key, result)
+                return result
+        finally:
+            # Drop the lock only once no caller holds or awaits it; locked() alone
+            # turns False before a woken waiter has re-acquired it
+            entry[1] -= 1
+            if not entry[1]:
+                del self._product_locks[key]
     
     async def test_connection(self) -> bool:
         """Test Shopify API connection"""
         try:
-            url = f"{self.config.base_url}/shop.json"
-            async with self.session.get(url, headers=self._get_headers()) as response:
+            url = self._shop_url
+            session = self.session or await self._ensure_session()
+            async with session.get(url, headers=self._headers) as response:
                 return response.status == 200
         except Exception as e:
-            logger.error(f"Shopify connection test failed: {e}")
+            logger.error("Shopify connection test failed: %s", e)
             return False
     
     async def search_products(self, query: str, limit: int = 10, 
                             product_type: Optional[str] = None) -> List[Dict]:
-        """Search for products in Shopify"""
+        """Search for products in Shopify (cached for PRODUCT_SEARCH_TTL seconds)"""
+        products = await self._cached_fetch(
+            ("search", query, product_type, limit),
+            self.PRODUCT_SEARCH_TTL,
+            lambda: self._search_products(query, limit, product_type)
+        )
+        # Cached entries are shared, so callers get their own copy to modify;
+        # formatted products only nest lists of strings, so no deep copy
+        return [_copy_product(product) for product in products] if products else []
+    
+    async def _search_products(self, query: str, limit: int,
+                               product_type: Optional[str]) -> Optional[List[Dict]]:
+        """Search products upstream; None on failure"""
         try:
-            url = f"{self.config.base_url}/products.json"
+            url = self._products_url
             params = {"limit": limit}
             
             if query:
@@ -192,165 +393,299 @@ class ShopifyIntegration(BaseIntegration):
             if product_type:
                 params["product_type"] = product_type
             
-            async with self.session.get(
+            session = self.session or await self._ensure_session()
+            async with session.get(
                 url, 
                 params=params, 
-                headers=self._get_headers()
+                headers=self._headers
             ) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = _json_loads(await response.read())
                     return self._format_products(data.get("products", []))
                 else:
-                    logger.error(f"Product search failed: {response.status}")
-                    return []
+                    logger.error("Product search failed: %s", response.status)
+                    return None
                     
         except Exception as e:
-            logger.error(f"Error searching products: {e}")
-            return []
+            logger.error("Error searching products: %s", e)
+            return None
     
     async def get_product_by_id(self, product_id: str) -> Optional[Dict]:
-        """Get specific product by ID"""
+        """Get specific product by ID (cached for PRODUCT_BY_ID_TTL seconds)"""
+        product = await self._cached_fetch(
+            ("product", str(product_id)),
+            self.PRODUCT_BY_ID_TTL,
+            lambda: self._get_product_by_id(product_id)
+        )
+        return _copy_product(product) if product is not None else None
+    
+    async def _get_product_by_id(self, product_id: str) -> Optional[Dict]:
+        """Fetch a single product upstream; None if missing or on failure"""
         try:
             url = f"{self.config.base_url}/products/{product_id}.json"
             
-            async with self.session.get(url, headers=self._get_headers()) as response:
+            session = self.session or await self._ensure_session()
+            async with session.get(url, headers=self._headers) as response:
                 if response.status == 200:
-                    data = await response.json()
-                    products = self._format_products([data.get("product")])
-                    return products[0] if products else None
+                    product = _json_loads(await response.read()).get("product")
+                    return self._format_product(product) if product else None
                 return None
                 
         except Exception as e:
-            logger.error(f"Error getting product: {e}")
+            logger.error("Error getting product: %s", e)
             return None
     
+    async def _graphql(self, query: str, variables: Dict[str, Any]) -> Optional[Dict]:
+        """Run an Admin GraphQL query; its data, or None on HTTP or query errors.
+        
+        Field-level errors arrive alongside partial data; that data is returned so
+        callers can skip the fields that failed.
+        """
+        payload = {"query": query, "variables": variables}
+        
+        session = self.session or await self._ensure_session()
+        async with session.post(
+            self._graphql_url, 
+            data=_json_dumps(payload), 
+            headers=self._headers
+        ) as response:
+            if response.status != 200:
+                logger.error("Shopify GraphQL request failed: %s", response.status)
+                return None
+            data = _json_loads(await response.read())
+        
+        errors = data.get("errors")
+        result = data.get("data")
+        if errors:
+            if not result:
+                logger.error("Shopify GraphQL query failed: %s", errors)
+                return None
+            logger.warning("Shopify GraphQL query partially failed: %s", errors)
+        return result or {}
+    
     async def get_customer_orders(self, customer_email: str) -> List[Dict]:
         """Get orders for a customer"""
         try:
-            # First find customer
-            customer = await self._find_customer_by_email(customer_email)
-            if not customer:
+            data = await self._graphql(self._CUSTOMER_ORDERS_QUERY, {"q": f"email:{customer_email}"})
+            if data is None:
                 return []
             
-            url = f"{self.config.base_url}/orders.json"
-            params = {"customer_id": customer["id"], "status": "any"}
-            
-            async with self.session.get(
-                url, 
-                params=params, 
-                headers=self._get_headers()
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return self._format_orders(data.get("orders", []))
+            customers = (data.get("customers") or {}).get("edges") or []
+            if not customers:
                 return []
+            customer = (customers[0] or {}).get("node") or {}
+            order_edges = (customer.get("orders") or {}).get("edges") or []
+            # Partial-error payloads can null out single orders; skip those, and any
+            # order without the numeric ID the REST shape needs, rather than all orders
+            orders = [
+                order for order in ((edge or {}).get("node") for edge in order_edges)
+                if order and order.get("legacyResourceId")
+            ]
+            
+            # Large orders only carry their first page of line items; fetch the rest
+            truncated = [
+                order for order in orders
+                if ((order.get("lineItems") or {}).get("pageInfo") or {}).get("hasNextPage")
+            ]
+            if truncated:
+                complete = await asyncio.gather(
+                    *(self._fetch_remaining_line_items(order) for order in truncated)
+                )
+                incomplete = {id(order) for order, done in zip(truncated, complete) if not done}
+                if incomplete:
+                    orders = [order for order in orders if id(order) not in incomplete]
+            
+            return self._format_orders(orders)
                 
         except Exception as e:
-            logger.error(f"Error getting customer orders: {e}")
+            logger.error("Error getting customer orders: %s", e)
             return []
     
-    async def _find_customer_by_email(self, email: str) -> Optional[Dict]:
-        """Find customer by email"""
-        try:
-            url = f"{self.config.base_url}/customers/search.json"
-            params = {"query": f"email:{email}"}
-            
-            async with self.session.get(
-                url, 
-                params=params, 
-                headers=self._get_headers()
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    customers = data.get("customers", [])
-                    return customers[0] if customers else None
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error finding customer: {e}")
-            return None
+    async def _fetch_remaining_line_items(self, order: Dict) -> bool:
+        """Append an order's remaining line item pages to its first page, in place.
+        
+        Returns False when the order has no GraphQL ID to page with.
+        """
+        order_id = order.get("id")
+        if not order_id:
+            return False
+        line_items = order["lineItems"]
+        edges = line_items["edges"] = line_items.get("edges") or []
+        page_info = line_items["pageInfo"]
+        
+        while page_info.get("hasNextPage"):
+            data = await self._graphql(
+                self._ORDER_LINE_ITEMS_QUERY,
+                {"id": order_id, "after": page_info.get("endCursor")}
+            )
+            page = ((data or {}).get("order") or {}).get("lineItems")
+            if not page:
+                # A partial order would look complete to callers, so fail the lookup
+                raise RuntimeError(f"line items unavailable for order {order_id}")
+            edges.extend(page.get("edges") or [])
+            page_info = page.get("pageInfo") or {}
+        return True
     
     def _format_products(self, products: List[Dict]) -> List[Dict]:
         """Format products for consistent API response"""
-        formatted = []
-        
-        for product in products:
-            if not product:
-                continue
-                
-            variants = product.get("variants", [])
-            main_variant = variants[0] if variants else {}
-            
-            formatted_product = {
-                "id": product.get("id"),
-                "title": product.get("title", ""),
-                "description": product.get("body_html", ""),
-                "product_type": product.get("product_type", ""),
-                "vendor": product.get("vendor", ""),
-                "price": main_variant.get("price", "0"),
-                "compare_at_price": main_variant.get("compare_at_price"),
-                "inventory_quantity": main_variant.get("inventory_quantity", 0),
-                "available": product.get("status") == "active",
-                "images": [img.get("src") for img in product.get("images", [])],
-                "tags": product.get("tags", "").split(", ") if product.get("tags") else [],
-                "handle": product.get("handle", ""),
-                "created_at": product.get("created_at"),
-                "updated_at": product.get("updated_at")
-            }
-            formatted.append(formatted_product)
+        format_product = self._format_product
+        return [format_product(product) for product in products if product]
+    
+    def _format_product(self, product: Dict) -> Dict:
+        """Format a single product for consistent API response"""
+        get = product.get
+        variants = get("variants")
+        main_variant = variants[0] if variants else _EMPTY_VARIANT
+        variant_get = main_variant.get
+        tags = get("tags")
+        images = get("images")
         
-        return formatted
+        return {
+            "id": get("id"),
+            "title": get("title", ""),
+            "description": get("body_html", ""),
+            "product_type": get("product_type", ""),
+            "vendor": get("vendor", ""),
+            "price": variant_get("price", "0"),
+            "compare_at_price": variant_get("compare_at_price"),
+            "inventory_quantity": variant_get("inventory_quantity", 0),
+            "available": get("status") == "active",
+            "images": [img.get("src") for img in images] if images else [],
+            "tags": tags.split(", ") if tags else [],
+            "handle": get("handle", ""),
+            "created_at": get("created_at"),
+            "updated_at": get("updated_at")
+        }
     
     def _format_orders(self, orders: List[Dict]) -> List[Dict]:
-        """Format orders for consistent API response"""
+        """Format GraphQL order nodes into the REST order shape"""
         formatted = []
+        append = formatted.append
         
         for order in orders:
-            formatted_order = {
-                "id": order.get("id"),
-                "order_number": order.get("order_number"),
-                "total_price": order.get("total_price"),
-                "financial_status": order.get("financial_status"),
-                "fulfillment_status": order.get("fulfillment_status"),
-                "created_at": order.get("created_at"),
-                "updated_at": order.get("updated_at"),
+            name = order.get("name") or ""
+            number = name.lstrip("#")
+            
+            append({
+                "id": int(order["legacyResourceId"]),
+                "order_number": int(number) if number.isdigit() else name,
+                "total_price": _shop_money(order.get("totalPriceSet")),
+                # Financial display statuses lower-case to the REST values (PARTIALLY_PAID -> partially_paid)
+                "financial_status": (order.get("displayFinancialStatus") or "").lower() or None,
+                "fulfillment_status": _REST_FULFILLMENT_STATUS.get(order.get("displayFulfillmentStatus")),
+                "created_at": order.get("createdAt"),
+                "updated_at": order.get("updatedAt"),
                 "line_items": [
                     {
                         "title": item.get("title"),
                         "quantity": item.get("quantity"),
-                        "price": item.get("price")
+                        "price": _shop_money(item.get("originalUnitPriceSet"))
                     }
-                    for item in order.get("line_items", [])
+                    for item in (
+                        (edge or {}).get("node") for edge in (order.get("lineItems") or {}).get("edges") or []
+                    )
+                    if item
                 ]
-            }
-            formatted.append(formatted_order)
+            })
         
         return formatted
 
 # OpenAI Integration
 class OpenAIIntegration(BaseIntegration):
+    # Slow, large completions: more concurrent sockets, longer-lived DNS entries.
+    # The pool limits also size the HTTP/2 client used when httpx is installed
+    connector_options = {
+        **BaseIntegration.connector_options,
+        "limit": 50,
+        "limit_per_host": 20,
+        "ttl_dns_cache": 600,
+        "enable_cleanup_closed": True
+    }
+    
+    # Completion retries on 429/5xx and dropped connections
+    MAX_ATTEMPTS = 3
+    RETRY_MAX_WAIT = 10
+    
     def __init__(self, config: OpenAIConfig):
         super().__init__(config)
         self.config: OpenAIConfig = config
-    
-    def _get_headers(self) -> Dict[str, str]:
-        """Get authentication headers for OpenAI API"""
-        return {
+        # Authentication headers for OpenAI API
+        self._headers = {
             "Authorization": f"Bearer {self.config.api_key}",
             "Content-Type": "application/json"
         }
+        # HTTP/2 client multiplexing concurrent completions over one connection
+        self._client = None
+    
+    async def connect(self):
+        """Open the HTTP/2 client when httpx is installed, else the aiohttp session"""
+        if not _HAS_HTTP2:
+            await super().connect()
+        elif self._client is None:
+            # Same pool sizing as the aiohttp connector. httpx has no per-host cap, and
+            # every request goes to one host, so limit_per_host bounds the idle pool;
+            # DNS caching and closed-transport cleanup only apply to aiohttp
+            options = self.connector_options
+            self._client = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=options["limit"],
+                    max_keepalive_connections=options["limit_per_host"],
+                    keepalive_expiry=options["keepalive_timeout"]
+                ),
+                timeout=httpx.Timeout(60.0)
+            )
+    
+    async def aclose(self):
+        """Close the HTTP/2 client and any aiohttp session"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        await super().aclose()
+    
+    async def _request(self, method: str, url: str, payload: Optional[Dict] = None,
+                       attempts: int = 1) -> tuple:
+        """Send a request, retrying rate limits, server errors and transport failures.
+        
+        The payload is serialized once and the same bytes are resent on every attempt.
+        Returns (status, body or None) from the last attempt.
+        """
+        data = _json_dumps(payload) if payload is not None else None
+        for attempt in range(1, attempts + 1):
+            try:
+                status, body = await self._send(method, url, data)
+            except _RETRYABLE_ERRORS:
+                if attempt == attempts:
+                    raise
+            else:
+                if status not in _RETRY_STATUSES or attempt == attempts:
+                    return status, body
+            # Exponential backoff with jitter: ~1s, ~2s, ... capped at RETRY_MAX_WAIT
+            await asyncio.sleep(min(2 ** (attempt - 1), self.RETRY_MAX_WAIT) + random.random())
+    
+    async def _send(self, method: str, url: str, data: Optional[bytes]) -> tuple:
+        """Send one request on whichever client is open; returns (status, body or None)"""
+        client = self._client
+        session = self.session
+        if client is None and session is None:
+            await self.connect()
+            client = self._client
+            session = self.session
+        
+        if client is not None:
+            response = await client.request(method, url, content=data, headers=self._headers)
+            return response.status_code, response.content if response.status_code == 200 else None
+        
+        async with session.request(method, url, data=data, headers=self._headers) as response:
+            return response.status, await response.read() if response.status == 200 else None
     
     async def test_connection(self) -> bool:
         """Test OpenAI API connection"""
         try:
-            # Ensure session is created
-            await self._ensure_session()
-            
-            url = f"{self.config.base_url}/models"
-            async with self.session.get(url, headers=self._get_headers()) as response:
-                return response.status == 200
+            status, _ = await self._request("GET", f"{self.config.base_url}/models")
+            return status == 200
         except Exception as e:
-            logger.error(f"OpenAI connection test failed: {e}")
+            logger.error("OpenAI connection test failed: %s", e)
             return False
     
     async def generate_response(self, messages: List[Dict], 
@@ -358,9 +693,6 @@ class OpenAIIntegration(BaseIntegration):
                               temperature: float = 0.7) -> Optional[str]:
         """Generate AI response using OpenAI"""
         try:
-            # Ensure session is created
-            await self._ensure_session()
-            
             url = f"{self.config.base_url}/chat/completions"
             
             payload = {
@@ -370,29 +702,75 @@ class OpenAIIntegration(BaseIntegration):
                 "temperature": temperature
             }
             
-            async with self.session.post(
-                url, 
-                json=payload, 
-                headers=self._get_headers()
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data["choices"][0]["message"]["content"]
-                else:
-                    logger.error(f"OpenAI API error: {response.status}")
-                    return None
+            status, body = await self._request("POST", url, payload, attempts=self.MAX_ATTEMPTS)
+            if status == 200:
+                data = _json_loads(body)
+                return data["choices"][0]["message"]["content"]
+            else:
+                logger.error("OpenAI API error: %s", status)
+                return None
                     
         except Exception as e:
-            logger.error(f"Error generating AI response: {e}")
+            logger.error("Error generating AI response: %s", e)
             return None
     
+    # System prompts are fixed per customer tier, so build them once
+    _SBDR_PROMPT = """You are an expert Sales Business Development Representative for TechHub Electronics. 
+        Your role is to qualify leads by understanding their needs, budget, and use case.
+        
+        Be friendly, professional, and focus on:
+        1. Understanding customer needs
+        2. Qualifying budget and timeline
+        3. Identifying the right products
+        4. Building rapport for handoff to specialists
+        
+        Keep responses concise and always ask qualifying questions."""
+    _SBDR_PROMPTS = {
+        "prospect": _SBDR_PROMPT + "\n\nThis is a new prospect. Focus on qualification.",
+        "default": _SBDR_PROMPT
+    }
+    
+    _ACCOUNT_MANAGER_PROMPT = """You are a Senior Account Manager for TechHub Electronics.
+        You handle qualified leads and existing customers with personalized service.
+        
+        Focus on:
+        1. Providing detailed product recommendations
+        2. Handling orders and account issues
+        3. Building long-term customer relationships
+        4. Offering premium service experience
+        
+        Be consultative and solution-oriented."""
+    _ACCOUNT_MANAGER_PROMPTS = {
+        "vip": _ACCOUNT_MANAGER_PROMPT + "\n\nThis is a VIP customer. Provide premium white-glove service.",
+        "default": _ACCOUNT_MANAGER_PROMPT
+    }
+    
+    _CUSTOMER_SUCCESS_PROMPT = """You are a Customer Success Representative for TechHub Electronics.
+        You help existing customers maximize value from their purchases.
+        
+        Focus on:
+        1. Onboarding and product education
+        2. Best practices and optimization
+        3. Proactive support and guidance
+        4. Ensuring customer satisfaction and retention
+        
+        Be helpful, educational, and proactive in identifying opportunities to help."""
+    
+    # Matching system messages, shared read-only by every request
+    _SBDR_SYSTEM_MESSAGES = {
+        tier: {"role": "system", "content": prompt} for tier, prompt in _SBDR_PROMPTS.items()
+    }
+    _ACCOUNT_MANAGER_SYSTEM_MESSAGES = {
+        tier: {"role": "system", "content": prompt} for tier, prompt in _ACCOUNT_MANAGER_PROMPTS.items()
+    }
+    _CUSTOMER_SUCCESS_SYSTEM_MESSAGE = {"role": "system", "content": _CUSTOMER_SUCCESS_PROMPT}
+    
     async def generate_sbdr_response(self, user_message: str, 
                                    user_context: Dict[str, Any]) -> Optional[str]:
         """Generate SBDR-specific response"""
-        system_prompt = self._build_sbdr_system_prompt(user_context)
-        
+        system_messages = self._SBDR_SYSTEM_MESSAGES
         messages = [
-            {"role": "system", "content": system_prompt},
+            system_messages.get(user_context.get("customer_tier"), system_messages["default"]),
             {"role": "user", "content": user_message}
         ]
         
@@ -401,10 +779,9 @@ class OpenAIIntegration(BaseIntegration):
     async def generate_account_manager_response(self, user_message: str, 
                                               user_context: Dict[str, Any]) -> Optional[str]:
         """Generate Account Manager response"""
-        system_prompt = self._build_account_manager_system_prompt(user_context)
-        
+        system_messages = self._ACCOUNT_MANAGER_SYSTEM_MESSAGES
         messages = [
-            {"role": "system", "content": system_prompt},
+            system_messages.get(user_context.get("customer_tier"), system_messages["default"]),
             {"role": "user", "content": user_message}
         ]
         
@@ -413,10 +790,8 @@ class OpenAIIntegration(BaseIntegration):
     async def generate_customer_success_response(self, user_message: str, 
                                                user_context: Dict[str, Any]) -> Optional[str]:
         """Generate Customer Success response"""
-        system_prompt = self._build_customer_success_system_prompt(user_context)
-        
         messages = [
-            {"role": "system", "content": system_prompt},
+            self._CUSTOMER_SUCCESS_SYSTEM_MESSAGE,
             {"role": "user", "content": user_message}
         ]
         
@@ -424,52 +799,15 @@ class OpenAIIntegration(BaseIntegration):
     
     def _build_sbdr_system_prompt(self, context: Dict[str, Any]) -> str:
         """Build system prompt for SBDR agent"""
-        base_prompt = """You are an expert Sales Business Development Representative for TechHub Electronics. 
-        Your role is to qualify leads by understanding their needs, budget, and use case.
-        
-        Be friendly, professional, and focus on:
-        1. Understanding customer needs
-        2. Qualifying budget and timeline
-        3. Identifying the right products
-        4. Building rapport for handoff to specialists
-        
-        Keep responses concise and always ask qualifying questions."""
-        
-        if context.get("customer_tier") == "prospect":
-            base_prompt += "\n\nThis is a new prospect. Focus on qualification."
-        
-        return base_prompt
+        return self._SBDR_PROMPTS.get(context.get("customer_tier"), self._SBDR_PROMPT)
     
     def _build_account_manager_system_prompt(self, context: Dict[str, Any]) -> str:
         """Build system prompt for Account Manager"""
-        base_prompt = """You are a Senior Account Manager for TechHub Electronics.
-        You handle qualified leads and existing customers with personalized service.
-        
-        Focus on:
-        1. Providing detailed product recommendations
-        2. Handling orders and account issues
-        3. Building long-term customer relationships
-        4. Offering premium service experience
-        
-        Be consultative and solution-oriented."""
-        
-        if context.get("customer_tier") == "vip":
-            base_prompt += "\n\nThis is a VIP customer. Provide premium white-glove service."
-        
-        return base_prompt
+        return self._ACCOUNT_MANAGER_PROMPTS.get(context.get("customer_tier"), self._ACCOUNT_MANAGER_PROMPT)
     
     def _build_customer_success_system_prompt(self, context: Dict[str, Any]) -> str:
         """Build system prompt for Customer Success"""
-        return """You are a Customer Success Representative for TechHub Electronics.
-        You help existing customers maximize value from their purchases.
-        
-        Focus on:
-        1. Onboarding and product education
-        2. Best practices and optimization
-        3. Proactive support and guidance
-        4. Ensuring customer satisfaction and retention
-        
-        Be helpful, educational, and proactive in identifying opportunities to help."""
+        return self._CUSTOMER_SUCCESS_PROMPT
 
 # Integration Manager
 class IntegrationManager:
@@ -492,6 +830,7 @@ class IntegrationManager:
         if openai_config:
             self.openai = OpenAIIntegration(openai_config)
         
+        await self._connect_all()
         self._initialized = True
     
     async def initialize_from_env(self):
@@ -527,25 +866,48 @@ class IntegrationManager:
             openai_config = OpenAIConfig(api_key=openai_key)
             self.openai = OpenAIIntegration(openai_config)
         
+        await self._connect_all()
         self._initialized = True
     
+    def _named_integrations(self) -> Dict[str, Integration]:
+        """Configured integrations by name"""
+        integrations: Dict[str, Optional[Integration]] = {
+            "crisp": self.crisp,
+            "shopify": self.shopify,
+            "openai": self.openai
+        }
+        return {name: integration for name, integration in integrations.items() if integration}
+    
+    def _integrations(self) -> List[Integration]:
+        """Configured integrations"""
+        return list(self._named_integrations().values())
+    
+    async def _connect_all(self):
+        """Open one long-lived session per configured integration"""
+        for integration in self._integrations():
+            await integration.connect()
+    
+    async def aclose(self):
+        """Close all integration sessions; call once at application shutdown"""
+        for integration in self._integrations():
+            await integration.aclose()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+    
     async def test_all_connections(self) -> Dict[str, bool]:
         """Test all configured integrations"""
-        results = {}
-        
-        if self.crisp:
-            async with self.crisp as crisp:
-                results["crisp"] = await crisp.test_connection()
-        
-        if self.shopify:
-            async with self.shopify as shopify:
-                results["shopify"] = await shopify.test_connection()
-        
-        if self.openai:
-            async with self.openai as openai:
-                results["openai"] = await openai.test_connection()
+        tests = {
+            name: integration.test_connection()
+            for name, integration in self._named_integrations().items()
+        }
         
-        return results
+        # The checks are independent, so run them concurrently
+        values = await asyncio.gather(*tests.values(), return_exceptions=True)
+        return {name: value is True for name, value in zip(tests, values)}
     
     async def send_message_to_crisp(self, session_id: str, message: str) -> bool:
         """Send message to Crisp if configured"""
@@ -553,8 +915,7 @@ class IntegrationManager:
             logger.warning("Crisp not configured")
             return False
         
-        async with self.crisp as crisp:
-            return await crisp.send_message(session_id, message)
+        return await self.crisp.send_message(session_id, message)
     
     async def search_products(self, query: str, product_type: Optional[str] = None) -> List[Dict]:
         """Search products in Shopify if configured"""
@@ -562,8 +923,7 @@ class IntegrationManager:
             logger.warning("Shopify not configured")
             return []
         
-        async with self.shopify as shopify:
-            return await shopify.search_products(query, product_type=product_type)
+        return await self.shopify.search_products(query, product_type=product_type)
     
     async def get_customer_orders(self, email: str) -> List[Dict]:
         """Get customer orders from Shopify if configured"""
@@ -571,8 +931,7 @@ class IntegrationManager:
             logger.warning("Shopify not configured")
             return []
         
-        async with self.shopify as shopify:
-            return await shopify.get_customer_orders(email)
+        return await self.shopify.get_customer_orders(email)
     
     async def generate_ai_response(self, agent_type: str, message: str, 
                                  context: Dict[str, Any]) -> Optional[str]:
@@ -581,20 +940,20 @@ class IntegrationManager:
             logger.warning("OpenAI not configured")
             return None
         
-        async with self.openai as openai:
-            if agent_type == "sbdr":
-                return await openai.generate_sbdr_response(message, context)
-            elif agent_type == "account_manager":
-                return await openai.generate_account_manager_response(message, context)
-            elif agent_type == "customer_success":
-                return await openai.generate_customer_success_response(message, context)
-            else:
-                # Fallback to basic response
-                messages = [
-                    {"role": "system", "content": "You are a helpful customer service representative."},
-                    {"role": "user", "content": message}
-                ]
-                return await openai.generate_response(messages)
+        openai = self.openai
+        if agent_type == "sbdr":
+            return await openai.generate_sbdr_response(message, context)
+        elif agent_type == "account_manager":
+            return await openai.generate_account_manager_response(message, context)
+        elif agent_type == "customer_success":
+            return await openai.generate_customer_success_response(message, context)
+        else:
+            # Fallback to basic response
+            messages = [
+                {"role": "system", "content": "You are a helpful customer service representative."},
+                {"role": "user", "content": message}
+            ]
+            return await openai.generate_response(messages)
 
 # Example usage and testing
 async def test_integrations():
@@ -634,11 +993,20 @@ async def test_integrations():
         if response:
             print(f"  AI Response: {response[:100]}...")
     
+    await integration_manager.aclose()
     print("\n✅ Integration tests completed!")
 
 if __name__ == "__main__":
     # Set up logging
     logging.basicConfig(level=logging.INFO)
     
-    # Run tests
-    asyncio.run(test_integrations())
\ No newline at end of file
+    # Run tests, on uvloop's libuv-based event loop when it is installed
+    try:
+        import uvloop
+    except ImportError:
+        uvloop = None
+    
+    if uvloop:
+        uvloop.run(test_integrations())
+    else:
+        asyncio.run(test_integrations())
\ No newline at end of file
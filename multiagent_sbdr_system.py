@@ -4,23 +4,36 @@ A Python-based multi-agent system for sales, account management, and customer su
 Built on the architecture from the existing SBDR project but with native Python agents.
 """
 
+import copy
 import json
+import os
+import functools
 import uuid
 import asyncio
 import logging
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Any, Callable, Union
-from dataclasses import dataclass, asdict, field
+from typing import Dict, List, Optional, Any, Callable, Union, Deque, Iterable
+from dataclasses import dataclass, field
 from enum import Enum
 from datetime import datetime
 import re
 import random
+from collections import deque
+from itertools import islice
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # optional accelerator; stdlib json accepts bytes as well
+    _json_loads = json.loads
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Enums from the original project
+# Enums from the original project. Each sets __hash__ = object.__hash__: members
+# compare by identity anyway, and Enum's own __hash__ is a Python-level call that
+# shows up in the routing table and value lookups on every message.
 class Intent(Enum):
     GREETING = "greeting"
     PRODUCT_INQUIRY = "product_inquiry"
@@ -33,6 +46,8 @@ class Intent(Enum):
     ACCOUNT_MANAGEMENT = "account_management"
     CUSTOMER_SUCCESS = "customer_success"
     GENERAL = "general"
+    
+    __hash__ = object.__hash__
 
 class QualificationStatus(Enum):
     NOT_STARTED = "not_started"
@@ -40,20 +55,141 @@ class QualificationStatus(Enum):
     COMPLETED = "completed"
     QUALIFIED = "qualified"
     UNQUALIFIED = "unqualified"
+    
+    __hash__ = object.__hash__
 
 class AgentType(Enum):
     SBDR = "sbdr"
     ACCOUNT_MANAGER = "account_manager"
     CUSTOMER_SUCCESS = "customer_success"
+    
+    __hash__ = object.__hash__
 
 class MessageType(Enum):
     USER_MESSAGE = "user_message"
     AGENT_RESPONSE = "agent_response"
     AGENT_HANDOFF = "agent_handoff"
     SYSTEM_NOTIFICATION = "system_notification"
+    
+    __hash__ = object.__hash__
+
+# Member -> value string; a dict hit is cheaper than the .value descriptor
+_ENUM_VALUES: Dict[Optional[Enum], Optional[str]] = {
+    member: member.value
+    for enum_cls in (Intent, QualificationStatus, AgentType, MessageType)
+    for member in enum_cls
+}
+
+# Intent patterns, compiled once. Greeting is checked first, then the product
+# keywords (plain substrings), then the remaining patterns in priority order.
+_GREETING_RE = re.compile(r'\b(?:hello|hi|hey|good\s+(?:morning|afternoon|evening)|greetings)\b')
+_PRODUCT_KEYWORDS = ("laptop", "computer", "phone", "smartphone", "tablet", "headphones")
+_INTENT_PATTERNS = (
+    (Intent.PRICING, re.compile(r'\b(?:price|cost|budget|how\s+much|expensive|cheap|affordable)\b').search),
+    (Intent.ORDER_STATUS, re.compile(r'\b(?:order|tracking|delivery|shipped|status|where\s+is\s+my)\b').search),
+    (Intent.ACCOUNT_MANAGEMENT, re.compile(r'\b(?:account|profile|subscription|billing|invoice|payment)\b').search),
+    (Intent.CUSTOMER_SUCCESS, re.compile(r'\b(?:onboarding|training|best\s+practices|optimize|usage|tips)\b').search),
+    (Intent.SUPPORT, re.compile(r'\b(?:help|support|problem|issue|broken|not\s+working|trouble)\b').search),
+    (Intent.HANDOFF_REQUEST, re.compile(r'\b(?:human|agent|representative|person|speak\s+to\s+someone|manager)\b').search),
+)
+_INTENT_CACHE_MAX_LEN = 256
+
+def _match_intent(content_lower: str) -> Intent:
+    """Return the highest-priority intent whose pattern matches the lowercased content."""
+    # Greeting patterns
+    if _GREETING_RE.search(content_lower):
+        return Intent.GREETING
+        
+    # Product inquiry patterns
+    for pattern in _PRODUCT_KEYWORDS:
+        if pattern in content_lower:
+            return Intent.PRODUCT_INQUIRY
+    
+    # Pricing, order status, account, customer success, support and handoff patterns
+    for intent, search in _INTENT_PATTERNS:
+        if search(content_lower):
+            return intent
+        
+    return Intent.GENERAL
+
+_match_intent_cached = functools.lru_cache(maxsize=2048)(_match_intent)
+
+def clear_intent_cache() -> None:
+    """Drop memoized intents; call after changing the intent patterns."""
+    _match_intent_cached.cache_clear()
+
+# Qualification patterns in priority order. Every budget pattern needs a digit,
+# so messages without one skip them entirely.
+_DIGIT_RE = re.compile(r'\d')
+_BUDGET_PATTERNS = tuple(re.compile(pattern).search for pattern in (
+    r'\$(\d+(?:,\d{3})*(?:\.\d{2})?)',
+    r'(\d+(?:,\d{3})*)\s*dollars?',
+    r'under\s*\$?(\d+(?:,\d{3})*)',
+    r'around\s*\$?(\d+(?:,\d{3})*)',
+    r'budget.*?\$?(\d+(?:,\d{3})*)'
+))
+_USE_CASE_PATTERNS = (
+    ("business", re.compile(r'\b(?:business|work|office|professional|corporate)\b').search),
+    ("gaming", re.compile(r'\b(?:gaming|game|gamer|esports|streaming)\b').search),
+    ("education", re.compile(r'\b(?:school|student|education|study|learning|college)\b').search),
+    ("creative", re.compile(r'\b(?:design|photo|video|creative|art|editing)\b').search),
+    ("personal", re.compile(r'\b(?:personal|home|family|casual|everyday)\b').search),
+)
+
+# Qualification status by number of filled qualification fields, below all three
+_PARTIAL_QUALIFICATION_STATUS = (
+    QualificationStatus.NOT_STARTED,
+    QualificationStatus.IN_PROGRESS,
+    QualificationStatus.IN_PROGRESS,
+)
+
+# Intents and tiers each agent accepts, checked by can_handle
+_SBDR_INTENTS = frozenset({
+    Intent.GREETING, Intent.PRODUCT_INQUIRY, Intent.PRICING,
+    Intent.GENERAL, Intent.QUALIFICATION_RESPONSE
+})
+_ACCOUNT_INTENTS = frozenset({
+    Intent.ACCOUNT_MANAGEMENT, Intent.ORDER_STATUS, Intent.HANDOFF_REQUEST,
+    Intent.PRODUCT_INQUIRY, Intent.PRICING
+})
+_SUCCESS_INTENTS = frozenset({Intent.CUSTOMER_SUCCESS, Intent.SUPPORT, Intent.GENERAL})
+_CUSTOMER_TIERS = frozenset({"customer", "vip"})
+
+# SBDR asks qualification questions for these intents until the lead is qualified
+_QUALIFY_INTENTS = frozenset({Intent.GREETING, Intent.PRODUCT_INQUIRY, Intent.PRICING, Intent.GENERAL})
+_PENDING_STATUSES = frozenset({QualificationStatus.NOT_STARTED, QualificationStatus.IN_PROGRESS})
+
+# Agents are tried in this order when routing a message
+_AGENT_PRIORITY = (AgentType.ACCOUNT_MANAGER, AgentType.CUSTOMER_SUCCESS, AgentType.SBDR)
+# Customer tiers the routing table is precomputed for; others use can_handle directly
+_KNOWN_TIERS = ("prospect", "customer", "vip")
+
+# Knowledge base policy entries and the keywords that select them, in priority order
+_POLICY_KEYWORDS = (
+    ("shipping_policy", ("ship", "delivery", "arrive")),
+    ("return_policy", ("return", "refund", "exchange")),
+    ("warranty_policy", ("warranty", "guarantee", "protection")),
+)
+
+# Only the most recent exchanges are kept per profile; the orchestrator keeps
+# the matching user and agent messages
+_HISTORY_MAXLEN = 200
+# Turns of profile history included in a conversation summary
+_SUMMARY_HISTORY_TURNS = 20
+
+def _summary_turn(turn: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a profile history turn with its timestamp as an ISO string.
+    
+    Turns recorded by the orchestrator hold a datetime; histories seeded or
+    restored from earlier versions already hold the string and pass through.
+    """
+    timestamp = turn.get("timestamp")
+    if isinstance(timestamp, datetime):
+        return {**turn, "timestamp": timestamp.isoformat()}
+    return dict(turn)
 
 # Data Models
-@dataclass
+@dataclass(slots=True)
 class UserProfile:
     session_id: str
     name: str = "Guest"
@@ -63,14 +199,23 @@ class UserProfile:
     use_case: Optional[str] = None
     timeline: Optional[str] = None
     qualification_status: QualificationStatus = QualificationStatus.NOT_STARTED
-    conversation_history: List[Dict] = field(default_factory=list)
+    conversation_history: Deque[Dict] = field(default_factory=lambda: deque(maxlen=_HISTORY_MAXLEN))
     engagement_score: int = 0
     current_agent: Optional[AgentType] = None
     customer_tier: str = "prospect"  # prospect, customer, vip
     lifetime_value: float = 0.0
     last_interaction: Optional[datetime] = None
+    # Running summary aggregates, updated as each turn is recorded. Dict keys
+    # serve as insertion-ordered sets, so summaries list values in first-seen order
+    agents_involved: Dict[str, None] = field(default_factory=dict)
+    intents_detected: Dict[str, None] = field(default_factory=dict)
+    
+    def __post_init__(self):
+        # Bound histories handed in as plain lists too
+        if not isinstance(self.conversation_history, deque):
+            self.conversation_history = deque(self.conversation_history, maxlen=_HISTORY_MAXLEN)
 
-@dataclass
+@dataclass(slots=True)
 class Message:
     id: str
     session_id: str
@@ -81,7 +226,7 @@ class Message:
     intent: Optional[Intent] = None
     metadata: Dict[str, Any] = field(default_factory=dict)
 
-@dataclass
+@dataclass(slots=True)
 class AgentResponse:
     content: str
     intent: Intent
@@ -108,44 +253,16 @@ class BaseAgent(ABC):
         """Determine if this agent can handle the given intent and user context"""
         pass
     
-    def detect_intent(self, message_content: str) -> Intent:
+    @staticmethod
+    def detect_intent(message_content: str) -> Intent:
         """Enhanced intent detection based on the original SBDR logic"""
-        content_lower = message_content.lower()
+        # Surrounding whitespace never changes a match, so it is dropped from the cache key
+        content_lower = message_content.lower().strip()
         
-        # Greeting patterns
-        if re.search(r'\b(hello|hi|hey|good\s+(morning|afternoon|evening)|greetings)\b', content_lower):
-            return Intent.GREETING
-            
-        # Product inquiry patterns
-        product_patterns = ["laptop", "computer", "phone", "smartphone", "tablet", "headphones"]
-        if any(pattern in content_lower for pattern in product_patterns):
-            return Intent.PRODUCT_INQUIRY
-            
-        # Pricing patterns
-        if re.search(r'\b(price|cost|budget|how\s+much|expensive|cheap|affordable)\b', content_lower):
-            return Intent.PRICING
-            
-        # Order status patterns
-        if re.search(r'\b(order|tracking|delivery|shipped|status|where\s+is\s+my)\b', content_lower):
-            return Intent.ORDER_STATUS
-            
-        # Account management patterns
-        if re.search(r'\b(account|profile|subscription|billing|invoice|payment)\b', content_lower):
-            return Intent.ACCOUNT_MANAGEMENT
-            
-        # Customer success patterns
-        if re.search(r'\b(onboarding|training|best\s+practices|optimize|usage|tips)\b', content_lower):
-            return Intent.CUSTOMER_SUCCESS
-            
-        # Support patterns
-        if re.search(r'\b(help|support|problem|issue|broken|not\s+working|trouble)\b', content_lower):
-            return Intent.SUPPORT
-            
-        # Handoff request patterns
-        if re.search(r'\b(human|agent|representative|person|speak\s+to\s+someone|manager)\b', content_lower):
-            return Intent.HANDOFF_REQUEST
-            
-        return Intent.GENERAL
+        # Repeat traffic ("hi", "help") is short; long messages would only churn the cache
+        if len(content_lower) <= _INTENT_CACHE_MAX_LEN:
+            return _match_intent_cached(content_lower)
+        return _match_intent(content_lower)
 
     def extract_qualification_data(self, message_content: str) -> Dict[str, str]:
         """Extract qualification data from message content"""
@@ -153,31 +270,16 @@ class BaseAgent(ABC):
         extracted_data = {}
         
         # Extract budget information
-        budget_patterns = [
-            r'\$(\d+(?:,\d{3})*(?:\.\d{2})?)',
-            r'(\d+(?:,\d{3})*)\s*dollars?',
-            r'under\s*\$?(\d+(?:,\d{3})*)',
-            r'around\s*\$?(\d+(?:,\d{3})*)',
-            r'budget.*?\$?(\d+(?:,\d{3})*)'
-        ]
-        
-        for pattern in budget_patterns:
-            match = re.search(pattern, content_lower)
-            if match:
-                extracted_data['budget'] = match.group(1).replace(',', '')
-                break
+        if _DIGIT_RE.search(content_lower):
+            for search in _BUDGET_PATTERNS:
+                match = search(content_lower)
+                if match:
+                    extracted_data['budget'] = match.group(1).replace(',', '')
+                    break
         
         # Extract use case
-        use_case_patterns = {
-            "business": [r'\b(business|work|office|professional|corporate)\b'],
-            "gaming": [r'\b(gaming|game|gamer|esports|streaming)\b'],
-            "education": [r'\b(school|student|education|study|learning|college)\b'],
-            "creative": [r'\b(design|photo|video|creative|art|editing)\b'],
-            "personal": [r'\b(personal|home|family|casual|everyday)\b']
-        }
-        
-        for use_case, patterns in use_case_patterns.items():
-            if any(re.search(pattern, content_lower) for pattern in patterns):
+        for use_case, search in _USE_CASE_PATTERNS:
+            if search(content_lower):
                 extracted_data['use_case'] = use_case
                 break
         
@@ -188,17 +290,20 @@ class SBDRAgent(BaseAgent):
     def __init__(self, knowledge_base: Dict[str, Any]):
         super().__init__(AgentType.SBDR, knowledge_base)
         
+        # Question lists resolved once; _generate_qualification_questions picks from them
+        question_bank = knowledge_base.get("qualification_questions", {})
+        self._product_questions = question_bank.get("product_questions", 
+            ["What type of product are you most interested in?"])
+        self._budget_questions = question_bank.get("budget_questions", 
+            ["What's your approximate budget for this purchase?"])
+        
     def can_handle(self, intent: Intent, user_profile: UserProfile) -> bool:
         """SBDR handles initial qualification and sales inquiries"""
-        qualifying_intents = [
-            Intent.GREETING, Intent.PRODUCT_INQUIRY, Intent.PRICING, 
-            Intent.GENERAL, Intent.QUALIFICATION_RESPONSE
-        ]
-        return intent in qualifying_intents and user_profile.customer_tier == "prospect"
+        return intent in _SBDR_INTENTS and user_profile.customer_tier == "prospect"
     
     async def process_message(self, message: Message, user_profile: UserProfile) -> AgentResponse:
         """Process message with SBDR lead qualification logic"""
-        intent = self.detect_intent(message.content)
+        intent = message.intent or self.detect_intent(message.content)
         extracted_data = self.extract_qualification_data(message.content)
         
         # Update user profile with extracted data
@@ -223,7 +328,7 @@ class SBDRAgent(BaseAgent):
             next_agent=next_agent,
             actions=["qualify_lead", "engage_prospect"],
             metadata={
-                "qualification_status": user_profile.qualification_status.value,
+                "qualification_status": _ENUM_VALUES[user_profile.qualification_status],
                 "extracted_data": extracted_data,
                 "engagement_score": user_profile.engagement_score
             }
@@ -231,19 +336,19 @@ class SBDRAgent(BaseAgent):
     
     def _update_user_profile(self, profile: UserProfile, extracted_data: Dict[str, str]):
         """Update user profile with qualification data"""
-        for field in ['budget', 'product_interest', 'use_case', 'timeline']:
-            if field in extracted_data:
-                setattr(profile, field, extracted_data[field])
-                profile.engagement_score += 1
+        if extracted_data:
+            for field in ('budget', 'product_interest', 'use_case', 'timeline'):
+                if field in extracted_data:
+                    setattr(profile, field, extracted_data[field])
+                    profile.engagement_score += 1
         
         # Update qualification status
-        qualification_fields = [profile.budget, profile.product_interest, profile.use_case]
-        filled_fields = sum(1 for field in qualification_fields if field is not None)
+        filled_fields = ((profile.budget is not None)
+                         + (profile.product_interest is not None)
+                         + (profile.use_case is not None))
         
-        if filled_fields == 0:
-            profile.qualification_status = QualificationStatus.NOT_STARTED
-        elif filled_fields < 3:
-            profile.qualification_status = QualificationStatus.IN_PROGRESS
+        if filled_fields < 3:
+            profile.qualification_status = _PARTIAL_QUALIFICATION_STATUS[filled_fields]
         else:
             profile.qualification_status = QualificationStatus.COMPLETED
             
@@ -317,17 +422,13 @@ Your goal is to qualify leads, understand their needs, and provide helpful produ
         query_lower = query.lower()
         policies = self.knowledge_base.get("policies", {})
         
-        policy_keywords = {
-            "shipping": ["ship", "delivery", "arrive"],
-            "return": ["return", "refund", "exchange"],
-            "warranty": ["warranty", "guarantee", "protection"]
-        }
-        
-        for policy_key, keywords in policy_keywords.items():
-            if any(keyword in query_lower for keyword in keywords):
-                policy_name = f"{policy_key}_policy"
-                if policy_name in policies:
-                    return policies[policy_name]
+        for policy_name, keywords in _POLICY_KEYWORDS:
+            for keyword in keywords:
+                if keyword in query_lower:
+                    if policy_name in policies:
+                        return policies[policy_name]
+                    # Missing policy: fall through to the next one
+                    break
         
         return None
     
@@ -349,21 +450,17 @@ Your goal is to qualify leads, understand their needs, and provide helpful produ
     
     def _needs_qualification_questions(self, profile: UserProfile, intent: Intent) -> bool:
         """Check if qualification questions are needed"""
-        return (profile.qualification_status in [QualificationStatus.NOT_STARTED, QualificationStatus.IN_PROGRESS] 
-                and intent in [Intent.GREETING, Intent.PRODUCT_INQUIRY, Intent.PRICING, Intent.GENERAL])
+        return profile.qualification_status in _PENDING_STATUSES and intent in _QUALIFY_INTENTS
     
     def _generate_qualification_questions(self, profile: UserProfile, intent: Intent) -> List[str]:
         """Generate contextual qualification questions"""
         questions = []
-        question_bank = self.knowledge_base.get("qualification_questions", {})
         
         if not profile.product_interest:
-            questions.append(random.choice(question_bank.get("product_questions", 
-                ["What type of product are you most interested in?"])))
+            questions.append(random.choice(self._product_questions))
         
         if not profile.budget:
-            questions.append(random.choice(question_bank.get("budget_questions", 
-                ["What's your approximate budget for this purchase?"])))
+            questions.append(random.choice(self._budget_questions))
         
         if not profile.use_case and profile.product_interest:
             questions.append(f"What will you primarily use the {profile.product_interest} for?")
@@ -377,17 +474,13 @@ class AccountManagerAgent(BaseAgent):
     
     def can_handle(self, intent: Intent, user_profile: UserProfile) -> bool:
         """Account Manager handles qualified leads and existing customers"""
-        account_intents = [
-            Intent.ACCOUNT_MANAGEMENT, Intent.ORDER_STATUS, Intent.HANDOFF_REQUEST,
-            Intent.PRODUCT_INQUIRY, Intent.PRICING
-        ]
-        return (intent in account_intents and 
+        return (intent in _ACCOUNT_INTENTS and 
                 (user_profile.qualification_status == QualificationStatus.QUALIFIED or 
-                 user_profile.customer_tier in ["customer", "vip"]))
+                 user_profile.customer_tier in _CUSTOMER_TIERS))
     
     async def process_message(self, message: Message, user_profile: UserProfile) -> AgentResponse:
         """Process message with account management focus"""
-        intent = self.detect_intent(message.content)
+        intent = message.intent or self.detect_intent(message.content)
         
         response_content = await self._generate_account_response(intent, user_profile, message.content)
         
@@ -449,13 +542,12 @@ class CustomerSuccessAgent(BaseAgent):
     
     def can_handle(self, intent: Intent, user_profile: UserProfile) -> bool:
         """Customer Success handles existing customers for onboarding and optimization"""
-        success_intents = [Intent.CUSTOMER_SUCCESS, Intent.SUPPORT, Intent.GENERAL]
-        return (intent in success_intents and 
-                user_profile.customer_tier in ["customer", "vip"])
+        return (intent in _SUCCESS_INTENTS and 
+                user_profile.customer_tier in _CUSTOMER_TIERS)
     
     async def process_message(self, message: Message, user_profile: UserProfile) -> AgentResponse:
         """Process message with customer success focus"""
-        intent = self.detect_intent(message.content)
+        intent = message.intent or self.detect_intent(message.content)
         
         response_content = await self._generate_success_response(intent, user_profile, message.content)
         
@@ -463,7 +555,8 @@ class CustomerSuccessAgent(BaseAgent):
         user_profile.current_agent = AgentType.CUSTOMER_SUCCESS
         user_profile.last_interaction = datetime.now()
         
-        actions = self._determine_success_actions(intent, user_profile)
+        health_score = self._calculate_health_score(user_profile)
+        actions = self._determine_success_actions(intent, user_profile, health_score)
         
         return AgentResponse(
             content=response_content,
@@ -472,7 +565,7 @@ class CustomerSuccessAgent(BaseAgent):
             actions=actions,
             metadata={
                 "interaction_type": "customer_success",
-                "customer_health_score": self._calculate_health_score(user_profile)
+                "customer_health_score": health_score
             }
         )
     
@@ -485,7 +578,8 @@ class CustomerSuccessAgent(BaseAgent):
         else:
             return f"Hello {profile.name}! As your customer success representative, I'm here to ensure you're maximizing the value of your investment with us."
     
-    def _determine_success_actions(self, intent: Intent, profile: UserProfile) -> List[str]:
+    def _determine_success_actions(self, intent: Intent, profile: UserProfile,
+                                   health_score: Optional[float] = None) -> List[str]:
         """Determine customer success actions"""
         actions = ["track_customer_health"]
         
@@ -495,18 +589,25 @@ class CustomerSuccessAgent(BaseAgent):
             actions.extend(["troubleshoot_issue", "escalate_if_needed"])
         
         # Proactive actions based on customer health
-        health_score = self._calculate_health_score(profile)
+        if health_score is None:
+            health_score = self._calculate_health_score(profile)
         if health_score < 0.5:
             actions.append("initiate_retention_workflow")
         
         return actions
     
-    def _calculate_health_score(self, profile: UserProfile) -> float:
+    def bulk_health_scores(self, profiles: Iterable[UserProfile]) -> Dict[str, float]:
+        """Health score per session, for periodic retention sweeps over many profiles"""
+        now = datetime.now()
+        calculate = self._calculate_health_score
+        return {profile.session_id: calculate(profile, now) for profile in profiles}
+    
+    def _calculate_health_score(self, profile: UserProfile, now: Optional[datetime] = None) -> float:
         """Calculate customer health score"""
         score = 0.5  # Base score
         
         if profile.last_interaction:
-            days_since = (datetime.now() - profile.last_interaction).days
+            days_since = ((now or datetime.now()) - profile.last_interaction).days
             if days_since < 30:
                 score += 0.3
             elif days_since < 60:
@@ -517,12 +618,18 @@ class CustomerSuccessAgent(BaseAgent):
         
         return min(1.0, score)
 
+@functools.lru_cache(maxsize=8)
+def _load_kb_cached(path: str, mtime_ns: int) -> Dict[str, Any]:
+    """Parse a knowledge base file; cached per file version, never handed out directly."""
+    with open(path, 'rb') as f:
+        return _json_loads(f.read())
+
 # Agent Orchestrator
 class AgentOrchestrator:
     def __init__(self, knowledge_base_path: str = "knowledge_base.json"):
         self.knowledge_base = self._load_knowledge_base(knowledge_base_path)
         self.user_profiles: Dict[str, UserProfile] = {}
-        self.conversation_history: Dict[str, List[Message]] = {}
+        self.conversation_history: Dict[str, Deque[Message]] = {}
         
         # Initialize agents
         self.agents = {
@@ -534,6 +641,9 @@ class AgentOrchestrator:
         # Integration handlers
         self.integrations = {}
         
+        # Routing decision for every (intent, qualification status, tier)
+        self._dispatch = self._build_dispatch_table()
+        
     def set_integration_manager(self, integration_manager):
         """Set integration manager for all agents"""
         for agent in self.agents.values():
@@ -542,8 +652,8 @@ class AgentOrchestrator:
     def _load_knowledge_base(self, path: str) -> Dict[str, Any]:
         """Load knowledge base from JSON file"""
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            # Each orchestrator gets its own copy, so mutating it cannot leak into others
+            return copy.deepcopy(_load_kb_cached(path, os.stat(path).st_mtime_ns))
         except FileNotFoundError:
             logger.warning(f"Knowledge base file {path} not found. Using minimal fallback.")
             return self._get_fallback_knowledge_base()
@@ -580,17 +690,42 @@ class AgentOrchestrator:
             )
         return self.user_profiles[session_id]
     
+    def _build_dispatch_table(self) -> Dict[tuple, Optional[AgentType]]:
+        """Precompute agent selection for every intent, status and known tier.
+        
+        can_handle only looks at the intent, qualification status and customer
+        tier, so one probe profile per (status, tier) answers it for all sessions.
+        """
+        table = {}
+        for status in QualificationStatus:
+            for tier in _KNOWN_TIERS:
+                probe = UserProfile(session_id="", qualification_status=status, customer_tier=tier)
+                for intent in Intent:
+                    table[(intent, status, tier)] = self._first_capable_agent(intent, probe)
+        return table
+    
+    def _first_capable_agent(self, intent: Intent, user_profile: UserProfile) -> Optional[AgentType]:
+        """First agent in priority order that can handle the message, or None"""
+        for agent_type in _AGENT_PRIORITY:
+            if self.agents[agent_type].can_handle(intent, user_profile):
+                return agent_type
+        return None
+    
     def _select_agent(self, intent: Intent, user_profile: UserProfile) -> BaseAgent:
         """Select the appropriate agent based on intent and user context"""
-        # Try agents in priority order
-        for agent_type in [AgentType.ACCOUNT_MANAGER, AgentType.CUSTOMER_SUCCESS, AgentType.SBDR]:
-            agent = self.agents[agent_type]
-            if agent.can_handle(intent, user_profile):
-                logger.info(f"Selected {agent_type.value} for intent {intent.value}")
-                return agent
+        key = (intent, user_profile.qualification_status, user_profile.customer_tier)
+        try:
+            agent_type = self._dispatch[key]
+        except KeyError:
+            # Tier outside _KNOWN_TIERS; try agents in priority order
+            agent_type = self._first_capable_agent(intent, user_profile)
         
-        # Default to SBDR agent
-        return self.agents[AgentType.SBDR]
+        if agent_type is None:
+            # Default to SBDR agent
+            return self.agents[AgentType.SBDR]
+        
+        logger.info(f"Selected {agent_type.value} for intent {intent.value}")
+        return self.agents[agent_type]
     
     async def process_message(self, session_id: str, message_content: str, 
                             user_name: str = "Guest", user_email: Optional[str] = None,
@@ -609,14 +744,8 @@ class AgentOrchestrator:
             timestamp=datetime.now()
         )
         
-        # Detect intent
-        intent = Intent.GENERAL
-        for agent in self.agents.values():
-            detected_intent = agent.detect_intent(message_content)
-            if detected_intent != Intent.GENERAL:
-                intent = detected_intent
-                break
-        
+        # Detect intent; every agent shares the same detector, so one pass is enough
+        intent = BaseAgent.detect_intent(message_content)
         message.intent = intent
         
         # Select appropriate agent
@@ -635,42 +764,50 @@ class AgentOrchestrator:
             response.metadata["previous_agent"] = selected_agent.agent_type.value
         
         # Store conversation history
-        if session_id not in self.conversation_history:
-            self.conversation_history[session_id] = []
-        
-        self.conversation_history[session_id].extend([
-            message,
-            Message(
-                id=str(uuid.uuid4()),
-                session_id=session_id,
-                content=response.content,
-                message_type=MessageType.AGENT_RESPONSE,
-                sender=selected_agent.name,
-                timestamp=datetime.now(),
-                intent=response.intent
-            )
-        ])
+        history = self.conversation_history.get(session_id)
+        if history is None:
+            history = self.conversation_history[session_id] = deque(maxlen=2 * _HISTORY_MAXLEN)
         
-        # Update user profile conversation history
+        now = datetime.now()
+        history.append(message)
+        history.append(Message(
+            id=str(uuid.uuid4()),
+            session_id=session_id,
+            content=response.content,
+            message_type=MessageType.AGENT_RESPONSE,
+            sender=selected_agent.name,
+            timestamp=now,
+            intent=response.intent
+        ))
+        
+        intent_value = _ENUM_VALUES[response.intent]
+        agent_value = _ENUM_VALUES[selected_agent.agent_type]
+        
+        # Recorded in message order: the user message's intent, then the response's
+        user_profile.intents_detected[_ENUM_VALUES[intent]] = None
+        user_profile.agents_involved[selected_agent.name] = None
+        user_profile.intents_detected[intent_value] = None
+        
+        # Update user profile conversation history; the timestamp is formatted on read
         user_profile.conversation_history.append({
             "message": message_content,
             "response": response.content,
-            "intent": response.intent.value,
-            "agent": selected_agent.agent_type.value,
-            "timestamp": datetime.now().isoformat()
+            "intent": intent_value,
+            "agent": agent_value,
+            "timestamp": now
         })
         
         return {
             "response": response.content,
-            "intent": response.intent.value,
-            "agent": selected_agent.agent_type.value,
+            "intent": intent_value,
+            "agent": agent_value,
             "confidence": response.confidence,
             "actions": response.actions,
             "user_profile": {
-                "qualification_status": user_profile.qualification_status.value,
+                "qualification_status": _ENUM_VALUES[user_profile.qualification_status],
                 "customer_tier": user_profile.customer_tier,
                 "engagement_score": user_profile.engagement_score,
-                "current_agent": user_profile.current_agent.value if user_profile.current_agent else None
+                "current_agent": _ENUM_VALUES.get(user_profile.current_agent)
             },
             "metadata": response.metadata
         }
@@ -681,14 +818,34 @@ class AgentOrchestrator:
             return {}
         
         profile = self.user_profiles[session_id]
-        history = self.conversation_history.get(session_id, [])
+        history = self.conversation_history.get(session_id, ())
+        
+        # Built by hand rather than with asdict(), which deep-copies the whole history
+        turns = profile.conversation_history
+        recent_turns = islice(turns, max(0, len(turns) - _SUMMARY_HISTORY_TURNS), None)
+        user_profile = {
+            "session_id": profile.session_id,
+            "name": profile.name,
+            "email": profile.email,
+            "budget": profile.budget,
+            "product_interest": profile.product_interest,
+            "use_case": profile.use_case,
+            "timeline": profile.timeline,
+            "qualification_status": profile.qualification_status,
+            "conversation_history": [_summary_turn(turn) for turn in recent_turns],
+            "engagement_score": profile.engagement_score,
+            "current_agent": profile.current_agent,
+            "customer_tier": profile.customer_tier,
+            "lifetime_value": profile.lifetime_value,
+            "last_interaction": profile.last_interaction
+        }
         
         return {
             "session_id": session_id,
-            "user_profile": asdict(profile),
+            "user_profile": user_profile,
             "conversation_length": len(history),
-            "agents_involved": list(set([msg.sender for msg in history if msg.message_type == MessageType.AGENT_RESPONSE])),
-            "intents_detected": list(set([msg.intent.value for msg in history if msg.intent])),
+            "agents_involved": list(profile.agents_involved),
+            "intents_detected": list(profile.intents_detected),
             "last_interaction": profile.last_interaction.isoformat() if profile.last_interaction else None
         }
 
@@ -742,9 +899,12 @@ async def main():
     ]
     
     for scenario in test_scenarios:
-        print(f"\n{'='*60}")
-        print(f"SCENARIO: {scenario['session_id']} ({scenario['customer_tier']})")
-        print(f"{'='*60}")
+        # Each scenario's transcript is written in one go rather than line by line
+        lines = []
+        out = lines.append
+        out(f"\n{'='*60}")
+        out(f"SCENARIO: {scenario['session_id']} ({scenario['customer_tier']})")
+        out(f"{'='*60}")
         
         for i, message in enumerate(scenario['messages']):
             result = await orchestrator.process_message(
@@ -753,20 +913,21 @@ async def main():
                 customer_tier=scenario['customer_tier']
             )
             
-            print(f"\nMessage {i+1}: {message}")
-            print(f"Agent: {result['agent']}")
-            print(f"Response: {result['response']}")
-            print(f"Intent: {result['intent']}")
-            print(f"Actions: {result['actions']}")
-            print(f"Status: {result['user_profile']['qualification_status']}")
-            print("-" * 40)
+            out(f"\nMessage {i+1}: {message}")
+            out(f"Agent: {result['agent']}")
+            out(f"Response: {result['response']}")
+            out(f"Intent: {result['intent']}")
+            out(f"Actions: {result['actions']}")
+            out(f"Status: {result['user_profile']['qualification_status']}")
+            out("-" * 40)
         
         # Show conversation summary
         summary = orchestrator.get_conversation_summary(scenario['session_id'])
-        print(f"\nConversation Summary:")
-        print(f"- Length: {summary['conversation_length']} messages")
-        print(f"- Agents: {summary['agents_involved']}")
-        print(f"- Intents: {summary['intents_detected']}")
+        out(f"\nConversation Summary:")
+        out(f"- Length: {summary['conversation_length']} messages")
+        out(f"- Agents: {summary['agents_involved']}")
+        out(f"- Intents: {summary['intents_detected']}")
+        print("\n".join(lines))
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -6,6 +6,8 @@ Comprehensive testing for the Python-based multi-agent system.
 import asyncio
 import unittest
 import json
+import re
+from datetime import datetime, timedelta
 from typing import Dict, List
 from unittest.mock import Mock, patch, AsyncMock
 import sys
@@ -16,7 +18,13 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from multiagent_sbdr_system import (
     AgentOrchestrator, SBDRAgent, AccountManagerAgent, CustomerSuccessAgent,
-    Intent, QualificationStatus, AgentType, UserProfile, Message, MessageType
+    Intent, QualificationStatus, AgentType, UserProfile, Message, MessageType,
+    clear_intent_cache
+)
+import aiohttp
+import multiagent_integrations
+from multiagent_integrations import (
+    ShopifyIntegration, ShopifyConfig, OpenAIIntegration, OpenAIConfig
 )
 
 class TestMultiAgentSystem(unittest.IsolatedAsyncioTestCase):
@@ -179,6 +187,21 @@ class TestMultiAgentSystem(unittest.IsolatedAsyncioTestCase):
             self.assertEqual(detected_intent, expected_intent, 
                            f"Failed for message: '{message}'")
 
+    async def test_intent_detection_cache(self):
+        """Test that memoized intents match fresh detection"""
+        sbdr_agent = self.orchestrator.agents[AgentType.SBDR]
+        messages = ["Hello there!", "  HELLO THERE!  ", "What's the price?", "what's the price?",
+                    "where is my package " * 20]
+        
+        clear_intent_cache()
+        first_pass = [sbdr_agent.detect_intent(message) for message in messages]
+        second_pass = [sbdr_agent.detect_intent(message) for message in messages]
+        
+        self.assertEqual(first_pass, second_pass)
+        self.assertEqual(first_pass[:2], [Intent.GREETING, Intent.GREETING])
+        self.assertEqual(first_pass[2:4], [Intent.PRICING, Intent.PRICING])
+        self.assertEqual(first_pass[4], Intent.ORDER_STATUS)
+
     async def test_qualification_data_extraction(self):
         """Test extraction of qualification data"""
         sbdr_agent = self.orchestrator.agents[AgentType.SBDR]
@@ -299,6 +322,35 @@ class TestMultiAgentSystem(unittest.IsolatedAsyncioTestCase):
             selected_agent = self.orchestrator._select_agent(intent, profile)
             self.assertEqual(selected_agent.agent_type, expected_agent_type)
 
+    async def test_bulk_health_scores(self):
+        """Test bulk customer health scoring matches the per-profile score"""
+        success_agent = self.orchestrator.agents[AgentType.CUSTOMER_SUCCESS]
+        
+        profiles = [
+            UserProfile(session_id="recent", customer_tier="customer",
+                        last_interaction=datetime.now(), engagement_score=6),
+            UserProfile(session_id="lapsed", customer_tier="customer",
+                        last_interaction=datetime.now() - timedelta(days=45)),
+            UserProfile(session_id="new", customer_tier="vip")
+        ]
+        
+        scores = success_agent.bulk_health_scores(profiles)
+        
+        self.assertEqual(scores, {"recent": 1.0, "lapsed": 0.6, "new": 0.5})
+        for profile in profiles:
+            self.assertEqual(scores[profile.session_id], success_agent._calculate_health_score(profile))
+
+    async def test_knowledge_base_isolated_between_orchestrators(self):
+        """Test that orchestrators loaded from the same file do not share knowledge base state"""
+        kb_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_base.json")
+        first = AgentOrchestrator(kb_path)
+        second = AgentOrchestrator(kb_path)
+        
+        first.knowledge_base.setdefault("policies", {})["shipping_policy"] = "Changed"
+        
+        self.assertNotEqual(second.knowledge_base.get("policies", {}).get("shipping_policy"), "Changed")
+        self.assertNotEqual(AgentOrchestrator(kb_path).knowledge_base.get("policies", {}).get("shipping_policy"), "Changed")
+
     async def test_conversation_summary_generation(self):
         """Test conversation summary functionality"""
         session_id = "summary_test"
@@ -326,6 +378,34 @@ class TestMultiAgentSystem(unittest.IsolatedAsyncioTestCase):
         self.assertIn('intents_detected', summary)
         self.assertGreater(summary['conversation_length'], 0)
 
+    async def test_conversation_summary_timestamps(self):
+        """Test that summary turns carry ISO timestamps, including restored string ones"""
+        session_id = "summary_timestamps"
+        profile = self.orchestrator.get_or_create_user_profile(session_id)
+        profile.conversation_history.append({
+            "message": "Hi", "response": "Hello!", "intent": "greeting",
+            "agent": "sbdr", "timestamp": "2024-01-01T09:30:00"
+        })
+        
+        await self.orchestrator.process_message(session_id=session_id, message_content="I need a laptop")
+        
+        turns = self.orchestrator.get_conversation_summary(session_id)['user_profile']['conversation_history']
+        self.assertEqual(turns[0]['timestamp'], "2024-01-01T09:30:00")
+        self.assertIsInstance(turns[1]['timestamp'], str)
+        self.assertEqual(datetime.fromisoformat(turns[1]['timestamp']),
+                         profile.conversation_history[1]['timestamp'])
+
+    async def test_conversation_summary_first_seen_order(self):
+        """Test that summary agents and intents are de-duplicated in first-seen order"""
+        session_id = "summary_order"
+        for message in ["Hello", "What's the price?", "Where is my order?", "Hello again"]:
+            await self.orchestrator.process_message(session_id=session_id, message_content=message)
+        
+        summary = self.orchestrator.get_conversation_summary(session_id)
+        
+        self.assertEqual(summary['intents_detected'], ['greeting', 'pricing', 'order_status'])
+        self.assertEqual(summary['agents_involved'], ['sbdr_agent'])
+
 class TestIntegrationScenarios(unittest.IsolatedAsyncioTestCase):
     """Test realistic end-to-end scenarios"""
     
@@ -400,6 +480,387 @@ class TestIntegrationScenarios(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result['agent'], 'account_manager')
         self.assertIn('apply_vip_benefits', result['actions'])
 
+class TestShopifyProductCache(unittest.IsolatedAsyncioTestCase):
+    """Test the Shopify product cache and request coalescing"""
+    
+    async def asyncSetUp(self):
+        """Set up an integration whose lookups never leave the process"""
+        self.shopify = ShopifyIntegration(ShopifyConfig(shop_domain="test-shop", access_token="token"))
+        self.calls = 0
+    
+    def _fetch(self, result):
+        """Fake upstream fetch that counts its calls"""
+        async def fetch():
+            self.calls += 1
+            return result
+        return fetch
+    
+    async def test_results_cached_until_ttl(self):
+        """Test that a cached result is reused until its TTL expires"""
+        with patch("multiagent_integrations.time.monotonic", return_value=1000.0) as clock:
+            await self.shopify._cached_fetch(("product", "1"), 60, self._fetch({"id": 1}))
+            clock.return_value = 1059.0
+            await self.shopify._cached_fetch(("product", "1"), 60, self._fetch({"id": 1}))
+            self.assertEqual(self.calls, 1)
+            
+            clock.return_value = 1060.0
+            await self.shopify._cached_fetch(("product", "1"), 60, self._fetch({"id": 1}))
+            self.assertEqual(self.calls, 2)
+    
+    async def test_least_recently_used_entry_evicted(self):
+        """Test that the cache evicts its least recently used entry when full"""
+        self.shopify.PRODUCT_CACHE_SIZE = 2
+        for product_id in ("1", "2"):
+            await self.shopify._cached_fetch(("product", product_id), 60, self._fetch({"id": product_id}))
+        # Touch "1" so "2" becomes the least recently used
+        await self.shopify._cached_fetch(("product", "1"), 60, self._fetch({"id": "1"}))
+        await self.shopify._cached_fetch(("product", "3"), 60, self._fetch({"id": "3"}))
+        
+        self.assertEqual(list(self.shopify._product_cache), [("product", "1"), ("product", "3")])
+        self.assertEqual(self.calls, 3)
+    
+    async def test_failures_not_cached(self):
+        """Test that failed lookups are retried on the next call"""
+        for _ in range(2):
+            result = await self.shopify._cached_fetch(("product", "missing"), 60, self._fetch(None))
+            self.assertIsNone(result)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.shopify._product_locks, {})
+    
+    async def test_concurrent_lookups_share_one_fetch(self):
+        """Test that concurrent duplicate lookups wait for a single fetch"""
+        async def slow_fetch():
+            self.calls += 1
+            await asyncio.sleep(0.01)
+            return [{"id": 1}]
+        
+        results = await asyncio.gather(*[
+            self.shopify._cached_fetch(("search", "laptop", None, 10), 60, slow_fetch)
+            for _ in range(5)
+        ])
+        
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(result == [{"id": 1}] for result in results))
+        self.assertEqual(self.shopify._product_locks, {})
+    
+    async def test_late_caller_waits_behind_queued_waiter(self):
+        """Test that a failed fetch never lets a new caller fetch alongside a waiter"""
+        key = ("product", "flaky")
+        release = asyncio.Event()
+        in_flight = 0
+        max_in_flight = 0
+        
+        async def failing_fetch():
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await release.wait()
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return None
+        
+        first = asyncio.create_task(self.shopify._cached_fetch(key, 60, failing_fetch))
+        waiter = asyncio.create_task(self.shopify._cached_fetch(key, 60, failing_fetch))
+        await asyncio.sleep(0)
+        release.set()
+        await first
+        late = asyncio.create_task(self.shopify._cached_fetch(key, 60, failing_fetch))
+        await asyncio.gather(waiter, late)
+        
+        self.assertEqual(max_in_flight, 1)
+        self.assertEqual(self.shopify._product_locks, {})
+    
+    async def test_public_lookups_return_copies(self):
+        """Test that callers cannot modify cached products"""
+        product = {"id": 7, "title": "Laptop", "tags": ["work"]}
+        with patch.object(self.shopify, "_get_product_by_id", AsyncMock(return_value=product)):
+            first = await self.shopify.get_product_by_id("7")
+            first["tags"].append("changed")
+            second = await self.shopify.get_product_by_id("7")
+        
+        self.assertEqual(second["tags"], ["work"])
+    
+    async def test_search_results_return_copies(self):
+        """Test that callers cannot modify cached search results"""
+        products = [{"id": 7, "title": "Laptop", "images": ["a.png"], "tags": ["work"]}]
+        with patch.object(self.shopify, "_search_products", AsyncMock(return_value=products)):
+            first = await self.shopify.search_products("laptop")
+            first[0]["title"] = "changed"
+            first[0]["images"].append("b.png")
+            first.append({"id": 8})
+            second = await self.shopify.search_products("laptop")
+        
+        self.assertEqual(second, [{"id": 7, "title": "Laptop", "images": ["a.png"], "tags": ["work"]}])
+
+class _FakeResponse:
+    """Canned aiohttp response usable as an async context manager"""
+    
+    def __init__(self, payload, status=200):
+        self.status = status
+        self._body = json.dumps(payload).encode()
+    
+    async def read(self):
+        return self._body
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+class _FakeSession:
+    """Session stand-in that replays canned responses and records request bodies"""
+    
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+    
+    def post(self, url, data=None, headers=None):
+        self.requests.append(json.loads(data))
+        return self.responses.pop(0)
+
+def _graphql_order(order_id, fulfillment_status, line_items, has_next_page=False):
+    """Order node as returned by the customer orders query"""
+    return {"node": {
+        "id": f"gid://shopify/Order/{order_id}",
+        "legacyResourceId": str(order_id),
+        "name": f"#{order_id}",
+        "totalPriceSet": {"shopMoney": {"amount": "99.0"}},
+        "displayFinancialStatus": "PARTIALLY_PAID",
+        "displayFulfillmentStatus": fulfillment_status,
+        "createdAt": "2024-01-01T00:00:00Z",
+        "updatedAt": "2024-01-02T00:00:00Z",
+        "lineItems": {
+            "pageInfo": {"hasNextPage": has_next_page, "endCursor": "cursor-1" if has_next_page else None},
+            "edges": [
+                {"node": {"title": title, "quantity": 1,
+                          "originalUnitPriceSet": {"shopMoney": {"amount": "10.0"}}}}
+                for title in line_items
+            ]
+        }
+    }}
+
+def _customer_orders_response(*orders, errors=None):
+    """Customer orders query response for one customer, optionally with partial errors"""
+    payload = {"data": {"customers": {"edges": [
+        {"node": {"orders": {"edges": list(orders)}}}
+    ]}}}
+    if errors:
+        payload["errors"] = errors
+    return _FakeResponse(payload)
+
+def _connection_cost(query):
+    """Shopify's requested cost of a query's connections.
+    
+    Each connection costs 2 + first, multiplied by the page sizes of the
+    connections enclosing it; plain objects add little and are not counted.
+    """
+    cost = 0
+    multipliers = [1]
+    pending = None
+    for match in re.finditer(r'first:\s*(\d+)|[{}]', query):
+        if match.group(1):
+            pending = int(match.group(1))
+        elif match.group(0) == '{':
+            if pending is None:
+                multipliers.append(multipliers[-1])
+            else:
+                cost += multipliers[-1] * (2 + pending)
+                multipliers.append(multipliers[-1] * pending)
+                pending = None
+        else:
+            multipliers.pop()
+    return cost
+
+class TestShopifyCustomerOrders(unittest.IsolatedAsyncioTestCase):
+    """Test mapping of the GraphQL customer orders query onto REST-shaped orders"""
+    
+    async def asyncSetUp(self):
+        """Set up an integration with no live session"""
+        self.shopify = ShopifyIntegration(ShopifyConfig(shop_domain="test-shop", access_token="token"))
+    
+    async def test_orders_mapped_to_rest_shape(self):
+        """Test that GraphQL order fields map onto the REST values"""
+        self.shopify.session = _FakeSession(_customer_orders_response(
+            _graphql_order(1001, "PARTIALLY_FULFILLED", ["Laptop"]),
+            _graphql_order(1002, "FULFILLED", ["Phone"]),
+            _graphql_order(1003, "IN_PROGRESS", ["Tablet"]),
+            _graphql_order(1004, "UNFULFILLED", ["Headphones"])
+        ))
+        
+        orders = await self.shopify.get_customer_orders("buyer@example.com")
+        
+        self.assertEqual([order["fulfillment_status"] for order in orders],
+                         ["partial", "fulfilled", None, None])
+        self.assertEqual(orders[0]["id"], 1001)
+        self.assertEqual(orders[0]["order_number"], 1001)
+        self.assertEqual(orders[0]["financial_status"], "partially_paid")
+        self.assertEqual(orders[0]["total_price"], "99.0")
+        self.assertEqual(orders[0]["line_items"], [{"title": "Laptop", "quantity": 1, "price": "10.0"}])
+        self.assertEqual(self.shopify.session.requests[0]["variables"], {"q": "email:buyer@example.com"})
+    
+    async def test_queries_within_shopify_cost_limit(self):
+        """Test that the order queries stay under Shopify's 1,000 point single-query limit"""
+        self.assertEqual(_connection_cost("{ a(first: 2) { b(first: 3) { c } } }"), 4 + 2 * 5)
+        self.assertLess(_connection_cost(ShopifyIntegration._CUSTOMER_ORDERS_QUERY), 1000)
+        self.assertLess(_connection_cost(ShopifyIntegration._ORDER_LINE_ITEMS_QUERY), 1000)
+    
+    async def test_query_errors_return_empty_list(self):
+        """Test that a GraphQL errors payload yields no orders"""
+        self.shopify.session = _FakeSession(_FakeResponse({"errors": [{"message": "Throttled"}]}))
+        
+        orders = await self.shopify.get_customer_orders("buyer@example.com")
+        
+        self.assertEqual(orders, [])
+    
+    async def test_null_orders_skipped(self):
+        """Test that null or ID-less orders in a partial-error payload are skipped, not fatal"""
+        id_less = _graphql_order(1002, "FULFILLED", ["Phone"])
+        del id_less["node"]["legacyResourceId"]
+        self.shopify.session = _FakeSession(_customer_orders_response(
+            {"node": None}, id_less, _graphql_order(1003, "FULFILLED", ["Tablet"]),
+            errors=[{"message": "Access denied for field", "path": ["customers", "edges", 0]}]
+        ))
+        
+        orders = await self.shopify.get_customer_orders("buyer@example.com")
+        
+        self.assertEqual([order["id"] for order in orders], [1003])
+    
+    async def test_null_orders_connection_returns_empty_list(self):
+        """Test that a nulled orders connection yields no orders without raising"""
+        self.shopify.session = _FakeSession(_FakeResponse({
+            "data": {"customers": {"edges": [{"node": {"orders": None}}]}},
+            "errors": [{"message": "Access denied for orders field"}]
+        }))
+        
+        with patch("multiagent_integrations.logger") as log:
+            orders = await self.shopify.get_customer_orders("buyer@example.com")
+        
+        self.assertEqual(orders, [])
+        log.error.assert_not_called()
+    
+    async def test_remaining_line_items_fetched(self):
+        """Test that orders with more line items than the first page come back complete"""
+        self.shopify.session = _FakeSession(
+            _customer_orders_response(_graphql_order(1001, "FULFILLED", ["Laptop"], has_next_page=True)),
+            _FakeResponse({"data": {"order": {"lineItems": {
+                "pageInfo": {"hasNextPage": False, "endCursor": None},
+                "edges": [{"node": {"title": "Mouse", "quantity": 2,
+                                    "originalUnitPriceSet": {"shopMoney": {"amount": "5.0"}}}}]
+            }}}})
+        )
+        
+        orders = await self.shopify.get_customer_orders("buyer@example.com")
+        
+        self.assertEqual([item["title"] for item in orders[0]["line_items"]], ["Laptop", "Mouse"])
+        self.assertEqual(self.shopify.session.requests[1]["variables"],
+                         {"id": "gid://shopify/Order/1001", "after": "cursor-1"})
+    
+    async def test_failed_line_item_page_returns_empty_list(self):
+        """Test that a lookup never returns an order with missing line items"""
+        self.shopify.session = _FakeSession(
+            _customer_orders_response(_graphql_order(1001, "FULFILLED", ["Laptop"], has_next_page=True)),
+            _FakeResponse({"errors": [{"message": "Throttled"}]})
+        )
+        
+        orders = await self.shopify.get_customer_orders("buyer@example.com")
+        
+        self.assertEqual(orders, [])
+
+class TestOpenAIConnection(unittest.IsolatedAsyncioTestCase):
+    """Test OpenAI client pool configuration"""
+    
+    @unittest.skipUnless(multiagent_integrations._HAS_HTTP2, "httpx[http2] not installed")
+    async def test_http2_pool_sized_from_connector_options(self):
+        """Test that the HTTP/2 client uses the documented connector pool limits"""
+        openai = OpenAIIntegration(OpenAIConfig(api_key="test-key"))
+        options = OpenAIIntegration.connector_options
+        
+        with patch("multiagent_integrations.httpx.AsyncClient") as client:
+            await openai.connect()
+        
+        limits = client.call_args.kwargs["limits"]
+        self.assertEqual(limits.max_connections, options["limit"])
+        self.assertEqual(limits.max_keepalive_connections, options["limit_per_host"])
+        self.assertEqual(limits.keepalive_expiry, options["keepalive_timeout"])
+
+class TestOpenAIRetries(unittest.IsolatedAsyncioTestCase):
+    """Test retry and backoff of OpenAI requests"""
+    
+    COMPLETION = json.dumps({"choices": [{"message": {"content": "Hi there"}}]}).encode()
+    
+    async def asyncSetUp(self):
+        """Set up an integration whose sends and sleeps are stubbed"""
+        self.openai = OpenAIIntegration(OpenAIConfig(api_key="test-key"))
+        self.sleep = AsyncMock()
+        patcher = patch("multiagent_integrations.asyncio.sleep", self.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        jitter = patch("multiagent_integrations.random.random", return_value=0.0)
+        jitter.start()
+        self.addCleanup(jitter.stop)
+    
+    def _stub_send(self, *outcomes):
+        """Replace _send with a stub returning (or raising) outcomes in order"""
+        self.openai._send = AsyncMock(side_effect=list(outcomes))
+        return self.openai._send
+    
+    def _waits(self):
+        return [call.args[0] for call in self.sleep.await_args_list]
+    
+    async def test_retry_statuses_retried_until_success(self):
+        """Test that rate limits and server errors are retried"""
+        send = self._stub_send((429, None), (503, None), (200, self.COMPLETION))
+        
+        response = await self.openai.generate_response([{"role": "user", "content": "Hello"}])
+        
+        self.assertEqual(response, "Hi there")
+        self.assertEqual(send.await_count, 3)
+        self.assertEqual(self._waits(), [1, 2])
+        # The payload is serialized once and resent as the same bytes
+        self.assertEqual(len({id(call.args[2]) for call in send.await_args_list}), 1)
+    
+    async def test_gives_up_after_max_attempts(self):
+        """Test that retries stop after MAX_ATTEMPTS"""
+        send = self._stub_send(*[(500, None)] * OpenAIIntegration.MAX_ATTEMPTS)
+        
+        response = await self.openai.generate_response([{"role": "user", "content": "Hello"}])
+        
+        self.assertIsNone(response)
+        self.assertEqual(send.await_count, OpenAIIntegration.MAX_ATTEMPTS)
+        self.assertEqual(len(self._waits()), OpenAIIntegration.MAX_ATTEMPTS - 1)
+    
+    async def test_client_errors_not_retried(self):
+        """Test that 4xx responses other than 429 return immediately"""
+        for status in (400, 401, 404):
+            send = self._stub_send((status, None))
+            
+            status_seen, body = await self.openai._request(
+                "POST", "https://api.example.com", {"model": "test"}, attempts=3
+            )
+            
+            self.assertEqual((status_seen, body), (status, None))
+            self.assertEqual(send.await_count, 1)
+        self.sleep.assert_not_awaited()
+    
+    async def test_transport_errors_retried_then_raised(self):
+        """Test that dropped connections are retried and the last error propagates"""
+        send = self._stub_send(aiohttp.ClientError("reset"), aiohttp.ClientError("reset"),
+                               aiohttp.ClientError("reset"))
+        
+        with self.assertRaises(aiohttp.ClientError):
+            await self.openai._request("POST", "https://api.example.com", {"model": "test"}, attempts=3)
+        self.assertEqual(send.await_count, 3)
+    
+    async def test_backoff_capped_at_max_wait(self):
+        """Test that exponential backoff never exceeds RETRY_MAX_WAIT"""
+        self.openai.RETRY_MAX_WAIT = 3
+        self._stub_send(*[(502, None)] * 6)
+        
+        await self.openai._request("GET", "https://api.example.com", attempts=6)
+        
+        self.assertEqual(self._waits(), [1, 2, 3, 3, 3])
+
 def run_performance_tests():
     """Run performance tests for the multi-agent system"""
     import time
@@ -488,10 +949,13 @@ def run_example_conversations():
         ]
         
         for scenario in scenarios:
-            print(f"\n{'='*60}")
-            print(f"SCENARIO: {scenario['name']}")
-            print(f"Customer: {scenario['user_name']} ({scenario['customer_tier']})")
-            print(f"{'='*60}")
+            # Each scenario's transcript is written in one go rather than line by line
+            lines = []
+            out = lines.append
+            out(f"\n{'='*60}")
+            out(f"SCENARIO: {scenario['name']}")
+            out(f"Customer: {scenario['user_name']} ({scenario['customer_tier']})")
+            out(f"{'='*60}")
             
             for i, message in enumerate(scenario['messages']):
                 result = await orchestrator.process_message(
@@ -501,22 +965,23 @@ def run_example_conversations():
                     customer_tier=scenario['customer_tier']
                 )
                 
-                print(f"\n👤 Customer: {message}")
-                print(f"🤖 {result['agent'].title()} Agent: {result['response']}")
-                print(f"📊 Intent: {result['intent']} | Actions: {result['actions']}")
-                print(f"📈 Status: {result['user_profile']['qualification_status']} | Score: {result['user_profile']['engagement_score']}")
+                out(f"\n👤 Customer: {message}")
+                out(f"🤖 {result['agent'].title()} Agent: {result['response']}")
+                out(f"📊 Intent: {result['intent']} | Actions: {result['actions']}")
+                out(f"📈 Status: {result['user_profile']['qualification_status']} | Score: {result['user_profile']['engagement_score']}")
                 
                 if 'handoff_occurred' in result['metadata']:
-                    print(f"🔄 Handoff from {result['metadata']['previous_agent']} to {result['agent']}")
+                    out(f"🔄 Handoff from {result['metadata']['previous_agent']} to {result['agent']}")
                 
-                print("-" * 40)
+                out("-" * 40)
             
             # Show final conversation summary
             summary = orchestrator.get_conversation_summary(scenario['session_id'])
-            print(f"\n📋 Conversation Summary:")
-            print(f"   Messages: {summary['conversation_length']}")
-            print(f"   Agents: {summary['agents_involved']}")
-            print(f"   Intents: {summary['intents_detected']}")
+            out(f"\n📋 Conversation Summary:")
+            out(f"   Messages: {summary['conversation_length']}")
+            out(f"   Agents: {summary['agents_involved']}")
+            out(f"   Intents: {summary['intents_detected']}")
+            print("\n".join(lines))
     
     asyncio.run(demo_conversations())
 
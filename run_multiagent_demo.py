@@ -340,6 +340,7 @@ async def run_comprehensive_demo():
     for agent, count in agent_usage.items():
         print(f"   {agent.title()}: {count} responses")
     
+    await orchestrator.integration_manager.aclose()
     print(f"\n✅ Demo completed successfully!")
 
 async def run_integration_tests():
@@ -376,6 +377,8 @@ async def run_integration_tests():
         print(f"   Mock products: {len(mock_products)} items")
         for product in mock_products:
             print(f"      - {product['title']} by {product['vendor']}: ${product['price']}")
+    
+    await integration_manager.aclose()
 
 if __name__ == "__main__":
     print("🚀 Starting Multi-Agent SBDR System Demo...")
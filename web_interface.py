@@ -79,6 +79,13 @@ async def startup_event():
     
     print("🚀 Multi-Agent SBDR System started successfully!")
 
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close integration sessions on shutdown"""
+    if integration_manager:
+        await integration_manager.aclose()
+
 # Health check endpoint
 @app.get("/health", response_model=HealthCheck)
 async def health_check():